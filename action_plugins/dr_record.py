@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import time
+
+from ansible.errors import AnsibleActionFail
+from ansible.module_utils.six import string_types
+from ansible.plugins.action import ActionBase
+
+DOCUMENTATION = '''
+---
+action: dr_record
+short_description: Record the outcome of the entities of a recovery phase
+description:
+    - Append the status of the entities handled by a phase of the recovery
+      to a journal file, one JSON line per event, instead of appending
+      them to facts which are templated again on every item.
+    - With C(summary), read the journal back and set the C(dr_report)
+      fact, which the report is rendered from.
+options:
+    journal:
+        description: Path of the journal file.
+        required: true
+    phase:
+        description: Name of the phase, e.g. C(register_vm).
+    started:
+        description:
+            - Entities the phase started to handle. The time until the
+              entity is recorded as succeeded or failed is its duration.
+        type: list
+    succeeded:
+        description:
+            - Entities the phase handled, either names or dicts with
+              C(name) and optionally C(seconds).
+        type: list
+    failed:
+        description:
+            - Entities the phase failed to handle, either names or dicts
+              with C(name) and optionally C(seconds) and C(msg).
+        type: list
+    error:
+        description: Error of all the failed entities which have no C(msg).
+    seconds:
+        description: Seconds the whole phase took.
+        type: float
+    summary:
+        description: Set the C(dr_report) fact out of the journal.
+        type: bool
+        default: false
+'''
+
+STATUSES = ('started', 'succeeded', 'failed')
+
+
+def _entities(value):
+    if value is None:
+        return []
+    if isinstance(value, (string_types, dict)):
+        value = [value]
+    return [
+        entity if isinstance(entity, dict) else {'name': entity}
+        for entity in value
+    ]
+
+
+def read_journal(journal):
+    if not os.path.exists(journal):
+        return []
+    with open(journal) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarize(records):
+    """
+    Fold the journal records in a list of phases, in the order they were
+    first recorded. Every entity ends up in the 'succeeded' or 'failed'
+    list of its phase according to its last record, so an entity is only
+    reported once.
+    """
+    phases = {}
+    order = []
+    for record in records:
+        name = record['phase']
+        if name not in phases:
+            order.append(name)
+            phases[name] = {'entities': {}, 'started': {}, 'seconds': None,
+                            'first': None, 'last': None}
+        phase = phases[name]
+        begin = record['time'] - (record.get('seconds') or 0)
+        if phase['first'] is None or begin < phase['first']:
+            phase['first'] = begin
+        if phase['last'] is None or record['time'] > phase['last']:
+            phase['last'] = record['time']
+        entity = record.get('entity')
+        if entity is None:
+            phase['seconds'] = (phase['seconds'] or 0) + record['seconds']
+        elif record['status'] == 'started':
+            phase['started'][entity] = record['time']
+        else:
+            seconds = record.get('seconds')
+            if seconds is None and entity in phase['started']:
+                seconds = record['time'] - phase['started'][entity]
+            phase['entities'].pop(entity, None)
+            phase['entities'][entity] = (record['status'], seconds,
+                                         record.get('error'))
+
+    report = []
+    for name in order:
+        phase = phases[name]
+        entities = phase['entities'].items()
+        seconds = phase['seconds']
+        if seconds is None:
+            seconds = phase['last'] - phase['first']
+        report.append({
+            'phase': name,
+            'succeeded': [entity for entity, (status, s, e) in entities
+                          if status == 'succeeded'],
+            'failed': [entity for entity, (status, s, e) in entities
+                       if status == 'failed'],
+            'errors': dict((entity, e) for entity, (status, s, e) in entities
+                           if e),
+            'seconds': round(seconds, 3),
+        })
+    return report
+
+
+class ActionModule(ActionBase):
+
+    TRANSFERS_FILES = False
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(ActionModule, self).run(tmp, task_vars)
+        args = self._task.args
+        journal = args.get('journal')
+        if not journal:
+            raise AnsibleActionFail("'journal' is required")
+
+        if args.get('summary'):
+            result['ansible_facts'] = {
+                'dr_report': summarize(read_journal(journal)),
+            }
+            return result
+
+        phase = args.get('phase')
+        if not phase:
+            raise AnsibleActionFail("'phase' is required")
+        now = time.time()
+        records = []
+        for status in STATUSES:
+            for entity in _entities(args.get(status)):
+                record = {'phase': phase, 'entity': entity['name'],
+                          'status': status, 'time': now}
+                if entity.get('seconds') is not None:
+                    record['seconds'] = float(entity['seconds'])
+                error = entity.get('msg') or args.get('error')
+                if status == 'failed' and error:
+                    record['error'] = str(error)
+                records.append(record)
+        if args.get('seconds') is not None:
+            records.append({'phase': phase, 'time': now,
+                            'seconds': float(args['seconds'])})
+        # The journal is only appended to, so recording an event does not
+        # depend on the number of events recorded before.
+        with open(journal, 'a') as f:
+            f.write(''.join(json.dumps(record) + '\n' for record in records))
+        result['changed'] = False
+        return result
@@ -39,10 +39,13 @@ install() {
   mkdir -p $PKG_DATA_DIR
   mkdir -p $PKG_DOC_DIR
 
+  cp -pR action_plugins/ $PKG_DATA_DIR
   cp -pR defaults/ $PKG_DATA_DIR
   cp -pR files/ $PKG_DATA_DIR
+  cp -pR filter_plugins/ $PKG_DATA_DIR
   cp -pR library/ $PKG_DATA_DIR
   cp -pR meta/ $PKG_DATA_DIR
+  cp -pR module_utils/ $PKG_DATA_DIR
   cp -pR tasks/ $PKG_DATA_DIR
 
   echo "Installation done."
@@ -3,6 +3,9 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import json
+import time
+
 from ansible.plugins.callback import CallbackBase
 
 # Not only visible to ansible-doc, it also 'declares' the options the plugin
@@ -14,8 +17,33 @@ DOCUMENTATION = '''
   version_added: "2.0"
   description:
       - This callback output the log of ansible play tasks.
+      - By default every task start and task result is written as a compact
+        JSON event on a line of its own.
+      - The full result dump of every task is only written in verbose format.
+  options:
+    format:
+      description: Output format of the task events.
+      default: json
+      choices: ['json', 'verbose']
+      env:
+        - name: DR_CALLBACK_FORMAT
+      ini:
+        - section: callback_dr_stdout
+          key: format
+    error_max_length:
+      description: Maximum length of the error message in a JSON event.
+      default: 512
+      type: int
+      env:
+        - name: DR_CALLBACK_ERROR_MAX_LENGTH
+      ini:
+        - section: callback_dr_stdout
+          key: error_max_length
 '''
 
+# Result keys of the oVirt modules which hold the entity the task handled.
+ENTITY_KEYS = ('vm', 'template', 'storagedomain', 'host', 'disk')
+
 
 class CallbackModule(CallbackBase):
     """
@@ -33,6 +61,59 @@ class CallbackModule(CallbackBase):
         # make sure the expected objects are present, calling the base's
         # __init__
         super(CallbackModule, self).__init__()
+        self._verbose = False
+        self._error_max_length = 512
+        self._task_start = {}
+
+    def set_options(self, task_keys=None, var_options=None, direct=None):
+        super(CallbackModule, self).set_options(task_keys=task_keys,
+                                                var_options=var_options,
+                                                direct=direct)
+        self._verbose = self.get_option('format') == 'verbose'
+        self._error_max_length = self.get_option('error_max_length')
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task_start[task._uuid] = time.time()
+        if not self._verbose:
+            self._event('task_start', task=task.get_name())
+
+    def v2_runner_on_ok(self, result):
+        if self._verbose:
+            self.runner_on_ok(result._host.get_name(), result._result)
+        else:
+            self._task_end(result, 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        if self._verbose:
+            self.runner_on_failed(result._host.get_name(), result._result,
+                                  ignore_errors)
+        else:
+            self._task_end(result, 'failed', ignore_errors=ignore_errors)
+
+    def v2_runner_on_skipped(self, result):
+        if self._verbose:
+            self.runner_on_skipped(result._host.get_name())
+        else:
+            self._task_end(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        if self._verbose:
+            self.runner_on_unreachable(result._host.get_name(),
+                                       result._result)
+        else:
+            self._task_end(result, 'unreachable')
+
+    def v2_runner_item_on_ok(self, result):
+        if not self._verbose:
+            self._task_end(result, 'ok', event='item_end')
+
+    def v2_runner_item_on_failed(self, result):
+        if not self._verbose:
+            self._task_end(result, 'failed', event='item_end')
+
+    def v2_runner_item_on_skipped(self, result):
+        if not self._verbose:
+            self._task_end(result, 'skipped', event='item_end')
 
     def runner_on_failed(self, host, res, ignore_errors=False):
         self._display.display('FAILED: %s %s' % (host, res))
@@ -54,3 +135,46 @@ class CallbackModule(CallbackBase):
 
     def playbook_on_not_import_for_host(self, host, missing_file):
         self._display.display('NOTIMPORTED: %s %s' % (host, missing_file))
+
+    def _task_end(self, result, status, event='task_end',
+                  ignore_errors=False):
+        start = self._task_start.get(result._task._uuid)
+        fields = {
+            'task': result._task.get_name(),
+            'status': status,
+            'duration': (round(time.time() - start, 3)
+                         if start is not None else None),
+            'entity': self._entity(result._result),
+        }
+        if result._result.get('changed'):
+            fields['changed'] = True
+        if status in ('failed', 'unreachable'):
+            fields['error'] = self._error(result._result)
+            if ignore_errors:
+                fields['ignored'] = True
+        self._event(event, **fields)
+
+    def _entity(self, res):
+        item = res.get('_ansible_item_label', res.get('item'))
+        if isinstance(item, dict):
+            return item.get('name') or item.get('id')
+        if item is not None:
+            return str(item)
+        for key in ENTITY_KEYS:
+            entity = res.get(key)
+            if isinstance(entity, dict):
+                return entity.get('name') or entity.get('id')
+        module_args = res.get('invocation', {}).get('module_args', {})
+        return module_args.get('name') or module_args.get('id')
+
+    def _error(self, res):
+        error = res.get('msg') or res.get('exception') or ''
+        error = str(error)
+        if len(error) > self._error_max_length:
+            error = error[:self._error_max_length] + '...'
+        return error
+
+    def _event(self, event, **fields):
+        record = {'event': event}
+        record.update(fields)
+        self._display.display(json.dumps(record, separators=(',', ':')))
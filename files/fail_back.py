@@ -5,7 +5,6 @@ __metaclass__ = type
 
 import logging
 import os.path
-import subprocess
 from subprocess import call
 import sys
 import time
@@ -14,6 +13,10 @@ from configparser import ConfigParser
 from ansible.module_utils.six.moves import input
 
 from bcolors import bcolors
+from mapping_loader import compiled_mapping_file
+from playbook_runner import CALLBACK_FORMATS, EXECUTORS, InProcessPlaybook, \
+    LogFile, check_result, format_event, parse_event, playbook_output_args, \
+    print_event, run_playbook
 
 INFO = bcolors.OKGREEN
 INPUT = bcolors.OKGREEN
@@ -30,33 +33,40 @@ class FailBack:
     def run(self, conf_file, log_file, log_level):
         log = self._set_log(log_file, log_level)
         log.info("Start failback operation...")
-        target_host, source_map, var_file, vault, ansible_play = \
-            self._init_vars(conf_file)
+        (target_host, source_map, var_file, vault, ansible_play,
+         callback_format, executor) = self._init_vars(conf_file)
         report = report_name.format(int(round(time.time() * 1000)))
         log.info("\ntarget_host: %s \n"
                  "source_map: %s \n"
                  "var_file: %s \n"
                  "vault: %s \n"
                  "ansible_play: %s \n"
+                 "callback_format: %s \n"
+                 "executor: %s \n"
                  "report log file: /tmp/%s\n",
                  target_host,
                  source_map,
                  var_file,
                  vault,
                  ansible_play,
+                 callback_format,
+                 executor,
                  report)
+        # Ansible loads the vars out of the compiled JSON sidecar of the
+        # mapping var file instead of parsing its YAML on every run.
+        vars_file = compiled_mapping_file(var_file)
+        log.info("Mapping vars file: %s", vars_file)
 
         dr_clean_tag = "clean_engine"
         extra_vars_cleanup = " dr_source_map=" + target_host
         command_cleanup = [
             "ansible-playbook", ansible_play,
             "-t", dr_clean_tag,
-            "-e", "@" + var_file,
+            "-e", "@" + vars_file,
             "-e", "@" + vault,
             "-e", extra_vars_cleanup,
             "--vault-password-file", "vault_secret.sh",
-            "-vvv"
-        ]
+        ] + playbook_output_args(callback_format)
 
         dr_failback_tag = "fail_back"
         extra_vars_failback = (" dr_target_host=" + target_host
@@ -65,12 +75,11 @@ class FailBack:
         command_failback = [
             "ansible-playbook", ansible_play,
             "-t", dr_failback_tag,
-            "-e", "@" + var_file,
+            "-e", "@" + vars_file,
             "-e", "@" + vault,
             "-e", extra_vars_failback,
             "--vault-password-file", "vault_secret.sh",
-            "-vvv"
-        ]
+        ] + playbook_output_args(callback_format)
 
         # Setting vault password.
         vault_pass_msg = ("Please enter vault password "
@@ -78,6 +87,15 @@ class FailBack:
         vault_pass = input(INPUT + PREFIX + vault_pass_msg + END)
         os.system("export vault_password=\"" + vault_pass + "\"")
 
+        runner = run_playbook
+        if executor == 'inprocess':
+            playbook = InProcessPlaybook(ansible_play,
+                                         [vars_file, vault],
+                                         vault_pass)
+            log.info("Loaded ansible play '%s' in %.2f seconds",
+                     ansible_play, playbook.load_time)
+            runner = playbook.run
+
         info_msg = ("Starting cleanup process of setup '{0}' for "
                     "oVirt ansible disaster recovery".format(target_host))
         log.info(info_msg)
@@ -86,9 +104,12 @@ class FailBack:
         log.info("Executing cleanup command: %s",
                  ' '.join(map(str, command_cleanup)))
         if log_file is not None and log_file != '':
-            self._log_to_file(log_file, command_cleanup)
+            result = self._log_to_file(log_file, command_cleanup,
+                                       callback_format, runner)
         else:
-            self._log_to_console(command_cleanup, log)
+            result = self._log_to_console(command_cleanup, log,
+                                          callback_format, runner)
+        self._log_phase_time(log, "cleanup", result)
 
         info_msg = ("Finished cleanup of setup '{0}' "
                     "for oVirt ansible disaster recovery".format(source_map))
@@ -104,54 +125,63 @@ class FailBack:
         log.info("Executing failback command: %s",
                  ' '.join(map(str, command_failback)))
         if log_file is not None and log_file != '':
-            self._log_to_file(log_file, command_failback)
+            result = self._log_to_file(log_file, command_failback,
+                                       callback_format, runner)
         else:
-            self._log_to_console(command_failback, log)
+            result = self._log_to_console(command_failback, log,
+                                          callback_format, runner)
+        self._log_phase_time(log, "failback", result)
 
         call(["cat", "/tmp/" + report])
         print("\n%s%sFinished failback operation"
               " for oVirt ansible disaster recovery%s" % (INFO, PREFIX, END))
 
-    def _log_to_file(self, log_file, command):
-        with open(log_file, "a") as f:
-            proc = subprocess.Popen(command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True)
-            for line in iter(proc.stdout.readline, ''):
-                if 'TASK [' in line:
+    def _log_to_file(self, log_file, command, callback_format=None,
+                     runner=run_playbook):
+        with LogFile(log_file) as f:
+            def _stdout(line):
+                event = parse_event(line)
+                if event is not None:
+                    print_event(event)
+                elif callback_format != 'json' and 'TASK [' in line:
                     print("\n%s%s%s\n" % (INFO, line, END))
                 if "[Failback Replication Sync]" in line:
                     print("%s%s%s" % (INFO, line, END))
                 f.write(line)
-            for line in iter(proc.stderr.readline, ''):
+
+            def _stderr(line):
                 f.write(line)
                 print("%s%s%s" % (WARN, line, END))
 
-    def _log_to_console(self, command, log):
-        proc = subprocess.Popen(command,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                universal_newlines=True)
-        for line in iter(proc.stdout.readline, ''):
+            result = runner(command, _stdout, _stderr, callback_format)
+        check_result(result, 'failback')
+        return result
+
+    def _log_to_console(self, command, log, callback_format=None,
+                        runner=run_playbook):
+        def _stdout(line):
+            event = parse_event(line)
             if "[Failback Replication Sync]" in line:
                 print("%s%s%s" % (INFO, line, END))
-            else:
+            elif event is None:
                 log.debug(line)
-        for line in iter(proc.stderr.readline, ''):
-            log.warn(line)
-        self._handle_result(command)
-
-    def _handle_result(self, command):
-        try:
-            # TODO: do something with the returned output?
-            subprocess.check_output(command, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            print("%sException: %s\n\n"
-                  "failback operation failed, please check log file for "
-                  "further details.%s"
-                  % (FAIL, e, END))
-            sys.exit()
+            elif event.get('status') in ('failed', 'unreachable'):
+                log.warn(format_event(event))
+            else:
+                log.info(format_event(event))
+
+        result = runner(command, _stdout, log.warn, callback_format)
+        check_result(result, 'failback')
+        return result
+
+    def _log_phase_time(self, log, phase, result):
+        if result.startup is None:
+            log.info("The %s phase took %.2f seconds",
+                     phase, result.duration)
+        else:
+            log.info("The %s phase took %.2f seconds, %.2f seconds of them "
+                     "until the first task started",
+                     phase, result.duration, result.startup)
 
     def _init_vars(self, conf_file):
         """ Declare constants """
@@ -161,6 +191,8 @@ class FailBack:
         _VAULT = "vault"
         _VAR_FILE = "var_file"
         _ANSIBLE_PLAY = 'ansible_play'
+        _CALLBACK_FORMAT = 'callback_format'
+        _EXECUTOR = 'executor'
         setups = ['primary', 'secondary']
 
         settings = ConfigParser()
@@ -177,6 +209,10 @@ class FailBack:
             settings.set(_SECTION, _VAR_FILE, '')
         if not settings.has_option(_SECTION, _ANSIBLE_PLAY):
             settings.set(_SECTION, _ANSIBLE_PLAY, '')
+        if not settings.has_option(_SECTION, _CALLBACK_FORMAT):
+            settings.set(_SECTION, _CALLBACK_FORMAT, 'json')
+        if not settings.has_option(_SECTION, _EXECUTOR):
+            settings.set(_SECTION, _EXECUTOR, 'subprocess')
         # We fetch the source map as target host,
         # since in failback we do the reverse operation.
         target_host = settings.get(_SECTION, _SOURCE,
@@ -201,6 +237,8 @@ class FailBack:
                                     vars=DefaultOption(settings,
                                                        _SECTION,
                                                        ansible_play=None))
+        callback_format = settings.get(_SECTION, _CALLBACK_FORMAT)
+        executor = settings.get(_SECTION, _EXECUTOR)
         while target_host not in setups:
             target_host = input(
                 INPUT + PREFIX + "The target host was not defined. "
@@ -227,7 +265,20 @@ class FailBack:
                                  "with ('%s'):%s "
                                  % (INPUT, PREFIX, str(ansible_play),
                                     PLAY_DEF, END) or PLAY_DEF)
-        return target_host, source_map, var_file, vault, ansible_play
+        while callback_format not in CALLBACK_FORMATS:
+            callback_format = input(
+                "%s%sCallback format '%s' is not supported. "
+                "Please provide the callback format (%s):%s "
+                % (INPUT, PREFIX, callback_format,
+                   '/'.join(CALLBACK_FORMATS), END)) or CALLBACK_FORMATS[0]
+        while executor not in EXECUTORS:
+            executor = input(
+                "%s%sExecutor '%s' is not supported. "
+                "Please provide the executor (%s):%s "
+                % (INPUT, PREFIX, executor, '/'.join(EXECUTORS), END)
+            ) or EXECUTORS[0]
+        return (target_host, source_map, var_file, vault, ansible_play,
+                callback_format, executor)
 
     def _set_log(self, log_file, log_level):
         logger = logging.getLogger(PREFIX)
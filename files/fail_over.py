@@ -5,7 +5,6 @@ __metaclass__ = type
 
 import logging
 import os.path
-import subprocess
 from subprocess import call
 import sys
 import time
@@ -14,6 +13,10 @@ from configparser import ConfigParser
 from ansible.module_utils.six.moves import input
 
 from bcolors import bcolors
+from mapping_loader import compiled_mapping_file
+from playbook_runner import CALLBACK_FORMATS, LogFile, check_result, \
+    format_event, parse_event, playbook_output_args, print_event, \
+    run_playbook
 
 INFO = bcolors.OKGREEN
 INPUT = bcolors.OKGREEN
@@ -30,21 +33,27 @@ class FailOver:
     def run(self, conf_file, log_file, log_level):
         log = self._set_log(log_file, log_level)
         log.info("Start failover operation...")
-        target_host, source_map, var_file, vault, ansible_play = \
-            self._init_vars(conf_file)
+        (target_host, source_map, var_file, vault, ansible_play,
+         callback_format) = self._init_vars(conf_file)
         report = report_name.format(int(round(time.time() * 1000)))
         log.info("\ntarget_host: %s \n"
                  "source_map: %s \n"
                  "var_file: %s \n"
                  "vault: %s \n"
                  "ansible_play: %s \n"
+                 "callback_format: %s \n"
                  "report log file: /tmp/%s\n",
                  target_host,
                  source_map,
                  var_file,
                  vault,
                  ansible_play,
+                 callback_format,
                  report)
+        # Ansible loads the vars out of the compiled JSON sidecar of the
+        # mapping var file instead of parsing its YAML on every run.
+        vars_file = compiled_mapping_file(var_file)
+        log.info("Mapping vars file: %s", vars_file)
 
         dr_tag = "fail_over"
         extra_vars = (" dr_target_host=" + target_host
@@ -53,12 +62,11 @@ class FailOver:
         command = [
             "ansible-playbook", ansible_play,
             "-t", dr_tag,
-            "-e", "@" + var_file,
+            "-e", "@" + vars_file,
             "-e", "@" + vault,
             "-e", extra_vars,
             "--vault-password-file", "vault_secret.sh",
-            "-vvv"
-        ]
+        ] + playbook_output_args(callback_format)
 
         # Setting vault password.
         vault_pass_msg = ("Please enter vault password "
@@ -68,49 +76,43 @@ class FailOver:
 
         log.info("Executing failover command: %s", ' '.join(map(str, command)))
         if log_file is not None and log_file != '':
-            self._log_to_file(log_file, command)
+            self._log_to_file(log_file, command, callback_format)
         else:
-            self._log_to_console(command, log)
+            self._log_to_console(command, log, callback_format)
 
         call(["cat", "/tmp/" + report])
         print("\n%s%sFinished failover operation"
               " for oVirt ansible disaster recovery%s" % (INFO, PREFIX, END))
 
-    def _log_to_file(self, log_file, command):
-        with open(log_file, "a") as f:
-            proc = subprocess.Popen(command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True)
-            for line in iter(proc.stdout.readline, ''):
-                if 'TASK [' in line:
+    def _log_to_file(self, log_file, command, callback_format=None):
+        with LogFile(log_file) as f:
+            def _stdout(line):
+                event = parse_event(line)
+                if event is not None:
+                    print_event(event)
+                elif callback_format != 'json' and 'TASK [' in line:
                     print("\n%s%s%s\n" % (INFO, line, END))
                 f.write(line)
-            for line in iter(proc.stderr.readline, ''):
+
+            def _stderr(line):
                 f.write(line)
                 print("%s%s%s" % (WARN, line, END))
-        self._handle_result(command)
-
-    def _log_to_console(self, command, log):
-        proc = subprocess.Popen(command,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                universal_newlines=True)
-        for line in iter(proc.stdout.readline, ''):
-            log.debug(line)
-        for line in iter(proc.stderr.readline, ''):
-            log.warn(line)
-
-    def _handle_result(self, command):
-        try:
-            # TODO: do something with the returned output?
-            subprocess.check_output(command, stderr=subprocess.STDOUT)
-        except subprocess.CalledProcessError as e:
-            print("%sException: %s\n\n"
-                  "failover operation failed, please check log file for "
-                  "further details.%s"
-                  % (FAIL, e, END))
-            sys.exit()
+
+            result = run_playbook(command, _stdout, _stderr, callback_format)
+        check_result(result, 'failover')
+
+    def _log_to_console(self, command, log, callback_format=None):
+        def _stdout(line):
+            event = parse_event(line)
+            if event is None:
+                log.debug(line)
+            elif event.get('status') in ('failed', 'unreachable'):
+                log.warn(format_event(event))
+            else:
+                log.info(format_event(event))
+
+        result = run_playbook(command, _stdout, log.warn, callback_format)
+        check_result(result, 'failover')
 
     def _init_vars(self, conf_file):
         """ Declare constants """
@@ -120,6 +122,7 @@ class FailOver:
         _VAULT = "vault"
         _VAR_FILE = "var_file"
         _ANSIBLE_PLAY = 'ansible_play'
+        _CALLBACK_FORMAT = 'callback_format'
         setups = ['primary', 'secondary']
 
         settings = ConfigParser()
@@ -136,6 +139,8 @@ class FailOver:
             settings.set(_SECTION, _VAR_FILE, '')
         if not settings.has_option(_SECTION, _ANSIBLE_PLAY):
             settings.set(_SECTION, _ANSIBLE_PLAY, '')
+        if not settings.has_option(_SECTION, _CALLBACK_FORMAT):
+            settings.set(_SECTION, _CALLBACK_FORMAT, 'json')
         target_host = settings.get(_SECTION, _TARGET,
                                    vars=DefaultOption(settings,
                                                       _SECTION,
@@ -156,6 +161,7 @@ class FailOver:
                                     vars=DefaultOption(settings,
                                                        _SECTION,
                                                        ansible_play=None))
+        callback_format = settings.get(_SECTION, _CALLBACK_FORMAT)
         while target_host not in setups:
             target_host = input(
                 INPUT + PREFIX + "The target host was not defined. "
@@ -182,7 +188,14 @@ class FailOver:
                                  "with ('%s'):%s "
                                  % (INPUT, PREFIX, str(ansible_play),
                                     PLAY_DEF, END) or PLAY_DEF)
-        return target_host, source_map, var_file, vault, ansible_play
+        while callback_format not in CALLBACK_FORMATS:
+            callback_format = input(
+                "%s%sCallback format '%s' is not supported. "
+                "Please provide the callback format (%s):%s "
+                % (INPUT, PREFIX, callback_format,
+                   '/'.join(CALLBACK_FORMATS), END)) or CALLBACK_FORMATS[0]
+        return (target_host, source_map, var_file, vault, ansible_play,
+                callback_format)
 
     def _set_log(self, log_file, log_level):
         logger = logging.getLogger(PREFIX)
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import stat
+
+import pytest
+
+import fail_over
+
+
+STUB_PLAYBOOK = """#!/bin/sh
+echo "$@" >> "{launches}"
+echo "TASK [oVirt.disaster-recovery : Recover target engine]"
+echo "[WARNING]: stub warning" >&2
+exit {returncode}
+"""
+
+
+def _stub_ansible_playbook(tmpdir, monkeypatch, returncode=0):
+    launches = tmpdir.join("launches")
+    stub = tmpdir.join("ansible-playbook")
+    stub.write(STUB_PLAYBOOK.format(launches=launches,
+                                    returncode=returncode))
+    stub.chmod(stat.S_IRWXU)
+    monkeypatch.setenv("PATH", str(tmpdir) + os.pathsep + os.environ["PATH"])
+    return launches
+
+
+def _command():
+    return ["ansible-playbook", "dr_play.yml", "-t", "fail_over"]
+
+
+def test_failover_launches_playbook_once(tmpdir, monkeypatch):
+    launches = _stub_ansible_playbook(tmpdir, monkeypatch)
+    log_file = tmpdir.join("ovirt-dr.log")
+
+    fail_over.FailOver()._log_to_file(str(log_file), _command())
+
+    assert len(launches.readlines()) == 1
+    assert "TASK [" in log_file.read()
+
+
+def test_failed_failover_is_not_rerun(tmpdir, monkeypatch):
+    launches = _stub_ansible_playbook(tmpdir, monkeypatch, returncode=2)
+    log_file = tmpdir.join("ovirt-dr.log")
+
+    with pytest.raises(SystemExit):
+        fail_over.FailOver()._log_to_file(str(log_file), _command())
+
+    assert len(launches.readlines()) == 1
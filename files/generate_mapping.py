@@ -6,43 +6,178 @@ __metaclass__ = type
 import sys
 import getopt
 import logging
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 import ovirtsdk4 as sdk
 import ovirtsdk4.types as otypes
 
+from inventory import (DEFAULT_SNAPSHOT_TTL, get_clusters,
+                       get_vnic_profile_mapping, invalidate_snapshot,
+                       load_snapshot, save_snapshot, search_pages)
+from sdk_proxy import Connection, Recording
+
 # TODO: log file location is currently in the same folder
 logging.basicConfig(level=logging.DEBUG, filename='generator.log')
 
+# Number of REST requests which are sent in parallel by default.
+DEFAULT_WORKERS = 8
+
+# Number of disks which are fetched per request by default.
+DEFAULT_PAGE_SIZE = 500
+
 
 # Documentation: We only support attached storage domains in the var generator.
 def main(argv):
-    url, username, password, ca, file_ = _init_vars(argv)
-    connection = _connect_sdk(url, username, password, ca, logging.getLogger())
-    host_storages = _get_host_storages_for_external_lun_disks(connection)
-    external_disks = _get_external_lun_disks(connection)
-    affinity_labels = _get_affinity_labels(connection)
-    domains = _get_aaa_domains(connection)
-    networks = _get_vnic_profile_mapping(connection)
+    (url, username, password, ca, file_, workers, page_size,
+     snapshot_dir, snapshot_ttl, refresh, record, replay) = _init_vars(argv)
+    recording = None
+    if replay:
+        recording = Recording.load(replay)
+        url = url or recording.urls()[0]
+    elif record:
+        recording = Recording()
+    if recording is not None:
+        # The requests must reach the recording, not be answered out of
+        # the inventory snapshot.
+        snapshot_dir = ''
+    if refresh:
+        invalidate_snapshot(snapshot_dir, url)
+    snapshot = load_snapshot(snapshot_dir, url, snapshot_ttl)
+    collections = [
+        ('host_storages', _get_host_storages_for_external_lun_disks),
+        ('external_disks',
+         lambda collector: _get_external_lun_disks(collector, page_size)),
+        ('data_centers', _get_dc_properties),
+    ]
+    if snapshot is None:
+        collections += [
+            ('clusters', _get_clusters),
+            ('affinity_labels', _get_affinity_labels),
+            ('aaa_domains', _get_aaa_domains),
+            ('vnic_profiles', _get_vnic_profile_mapping),
+        ]
+    else:
+        logging.info("Using the inventory snapshot of %s", url)
+    collector = _Collector(
+        lambda: _connect(url, username, password, ca, recording, replay),
+        workers)
+    try:
+        inventory = collector.collect(collections)
+    finally:
+        collector.close()
+    if record:
+        recording.save(record)
+    if snapshot is None:
+        clusters, affinity_groups = inventory['clusters']
+        snapshot = dict(inventory, clusters=clusters,
+                        affinity_groups=affinity_groups)
+        save_snapshot(snapshot_dir, url, snapshot)
 
     f = open(file_, 'w')
     _write_file_header(f, url, username, ca)
-    clusters, affinity_groups = _handle_dc_properties(f, connection)
-    _write_clusters(f, clusters)
-    _write_affinity_groups(f, affinity_groups)
-    _write_affinity_labels(f, affinity_labels)
-    _write_aaa_domains(f, domains)
+    _handle_dc_properties(f, inventory['data_centers'])
+    _write_clusters(f, snapshot['clusters'])
+    _write_affinity_groups(f, snapshot['affinity_groups'])
+    _write_affinity_labels(f, snapshot['affinity_labels'])
+    _write_aaa_domains(f, snapshot['aaa_domains'])
     _write_roles(f)
-    _write_vnic_profiles(f, networks)
-    _write_external_lun_disks(f, external_disks, host_storages)
-    connection.close()
+    _write_vnic_profiles(f, snapshot['vnic_profiles'])
+    _write_external_lun_disks(f, inventory['external_disks'],
+                              inventory['host_storages'])
+
+
+class _Collector:
+    """
+    Fetch the collections of the inventory in parallel.
+
+    Every collection runs on a thread of its own, and sends its requests
+    per entity through map(), which runs them on a pool of 'workers'
+    threads. Each thread uses its own SDK connection, since a connection
+    must not be shared between threads.
+    """
+
+    def __init__(self, connect, workers):
+        self._connect = connect
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers))
+
+    def connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._connect()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def map(self, fn, items):
+        """
+        Return the list of fn(connection, item) for every item, called on
+        the worker pool.
+        """
+        return list(self._pool.map(
+            lambda item: fn(self.connection(), item), items))
+
+    def collect(self, collections):
+        """
+        Run every (name, fn) collection, fn(collector), in parallel and
+        return a dict of name to result. The time every collection took is
+        logged.
+        """
+        timings = {}
+
+        def _timed(name, fn):
+            start = time.time()
+            try:
+                return fn(self)
+            finally:
+                timings[name] = time.time() - start
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=len(collections)) as pool:
+            futures = [(name, pool.submit(_timed, name, fn))
+                       for name, fn in collections]
+            inventory = dict((name, future.result())
+                             for name, future in futures)
+        for name, fn in collections:
+            logging.info("Collected %s in %.2f seconds", name, timings[name])
+        logging.info("Collected the inventory in %.2f seconds with %d "
+                     "requests", time.time() - start, self.requests())
+        return inventory
+
+    def requests(self):
+        """
+        Return the number of requests sent by the connections so far.
+        """
+        with self._lock:
+            return sum(connection.requests
+                       for connection in self._connections)
+
+    def close(self):
+        self._pool.shutdown()
+        for connection in self._connections:
+            connection.close()
 
 
 def _init_vars(argv):
     url, username, password, ca, file_ = '', '', '', '', ''
+    workers = DEFAULT_WORKERS
+    page_size = DEFAULT_PAGE_SIZE
+    snapshot_dir = ''
+    snapshot_ttl = DEFAULT_SNAPSHOT_TTL
+    refresh = False
+    record, replay = '', ''
     try:
         opts, args = getopt.getopt(
             argv,
-            "a:u:p:f:c:", ["a=", "u=", "p=", "f=", "c="])
+            "a:u:p:f:c:w:s:d:t:r",
+            ["a=", "u=", "p=", "f=", "c=", "w=", "s=", "d=", "t=", "r",
+             "record=", "replay="])
     except getopt.GetoptError:
         print(
             '''
@@ -50,7 +185,14 @@ def _init_vars(argv):
             -u <admin@portal>\n
             -p <password>\n
             -c </etc/pki/ovirt-engine/ca.pem>\n
-            -f <disaster_recovery_vars.yml>
+            -f <disaster_recovery_vars.yml>\n
+            -w <number of parallel requests>\n
+            -s <number of disks fetched per request>\n
+            -d <inventory snapshot directory>\n
+            -t <seconds an inventory snapshot is used for>\n
+            -r refresh the inventory snapshot\n
+            --record <file to record the engine responses to>\n
+            --replay <file to replay the engine responses from>
             ''')
         sys.exit(2)
 
@@ -63,7 +205,14 @@ def _init_vars(argv):
                 -u <admin@portal>\n
                 -p <password>\n
                 -c </etc/pki/ovirt-engine/ca.pem>\n
-                -f <disaster_recovery_vars.yml>
+                -f <disaster_recovery_vars.yml>\n
+                -w <number of parallel requests>\n
+                -s <number of disks fetched per request>\n
+                -d <inventory snapshot directory>\n
+                -t <seconds an inventory snapshot is used for>\n
+                -r refresh the inventory snapshot\n
+                --record <file to record the engine responses to>\n
+                --replay <file to replay the engine responses from>
                 ''')
             sys.exit()
         elif opt in ("-a", "--url"):
@@ -76,7 +225,35 @@ def _init_vars(argv):
             ca = arg
         elif opt in ("-f", "--file"):
             file_ = arg
-    return url, username, password, ca, file_
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-s", "--page-size"):
+            page_size = int(arg)
+        elif opt in ("-d", "--snapshot-dir"):
+            snapshot_dir = arg
+        elif opt in ("-t", "--snapshot-ttl"):
+            snapshot_ttl = int(arg)
+        elif opt in ("-r", "--refresh"):
+            refresh = True
+        elif opt == "--record":
+            record = arg
+        elif opt == "--replay":
+            replay = arg
+    return (url, username, password, ca, file_, workers, page_size,
+            snapshot_dir, snapshot_ttl, refresh, record, replay)
+
+
+def _connect(url, username, password, ca, recording, replay):
+    """
+    Return a connection to the engine, which counts the requests it sends
+    and records their responses if a recording is given, or a connection
+    which replays them, without the engine, if 'replay' is set.
+    """
+    if replay:
+        return Connection(url, recording)
+    return Connection(url, recording,
+                      _connect_sdk(url, username, password, ca,
+                                   logging.getLogger()))
 
 
 def _connect_sdk(url, username, password, ca, log_):
@@ -114,112 +291,85 @@ def _write_file_header(f, url, username, ca):
     f.write("dr_sites_secondary_ca_file: # %s\n\n" % ca)
 
 
-def _handle_dc_properties(f, connection):
+def _handle_dc_properties(f, data_centers):
     f.write("dr_import_storages:\n")
-    dcs_service = connection.system_service().data_centers_service()
-    dcs_list = dcs_service.list()
-    clusters = []
-    affinity_groups = []
-    for dc in dcs_list:
-        dc_service = dcs_service.data_center_service(dc.id)
-        _write_attached_storage_domains(f, dc_service, dc)
-        _add_clusters_and_aff_groups_for_dc(dc_service,
-                                            clusters,
-                                            affinity_groups)
-    return clusters, affinity_groups
-
-
-def _get_host_storages_for_external_lun_disks(connection):
+    for dc, attached_sds in data_centers:
+        _write_attached_storage_domains(f, dc, attached_sds)
+
+
+def _get_dc_properties(collector):
+    """
+    Return a list of (dc, attached storage domains) for every data center.
+    The storage domains are followed from the data centers, so a single
+    request is sent whatever the number of data centers.
+    """
+    dcs_list = collector.connection().system_service() \
+        .data_centers_service().list(follow='storage_domains')
+    return [(dc, dc.storage_domains or []) for dc in dcs_list]
+
+
+def _get_clusters(collector):
+    return get_clusters(collector.connection())
+
+
+def _get_host_storages_for_external_lun_disks(collector):
     host_storages = {}
-    hosts_service = connection.system_service().hosts_service()
+    hosts_service = collector.connection().system_service().hosts_service()
     hosts_list = hosts_service.list(search='status=up')
 
     # The reason we go over each active Host in the DC is that there might
     # be a Host which fail to connect to a certain device but still be active.
-    for host in hosts_list:
-        host_storages_service = hosts_service.host_service(host.id) \
-            .storage_service().list()
-        for host_storage in host_storages_service:
+    for host_storages_list in collector.map(_get_host_storages, hosts_list):
+        for host_storage in host_storages_list:
             if host_storage.id not in host_storages.keys():
                 host_storages[host_storage.id] = host_storage
     return host_storages
 
 
-def _get_external_lun_disks(connection):
+def _get_host_storages(connection, host):
+    return connection.system_service().hosts_service() \
+        .host_service(host.id).storage_service().list()
+
+
+def _get_external_lun_disks(collector, page_size):
     external_disks = []
-    disks_service = connection.system_service().disks_service()
-    disks_list = disks_service.list()
-    for disk in disks_list:
+    disks_service = collector.connection().system_service().disks_service()
+    # Only the LUN disks are fetched, a page at a time, instead of all the
+    # image disks of the engine.
+    for disk in search_pages(disks_service, 'disk_type=lun', page_size):
         if otypes.DiskStorageType.LUN == disk.storage_type:
             external_disks.append(disk)
     return external_disks
 
 
-def _get_affinity_labels(connection):
+def _get_affinity_labels(collector):
     affinity_labels = []
     affinity_labels_service = \
-        connection.system_service().affinity_labels_service()
+        collector.connection().system_service().affinity_labels_service()
     affinity_labels_list = affinity_labels_service.list()
     for affinity_label in affinity_labels_list:
         affinity_labels.append(affinity_label.name)
     return affinity_labels
 
 
-def _get_aaa_domains(connection):
+def _get_aaa_domains(collector):
     domains = []
-    domains_service = connection.system_service().domains_service()
+    domains_service = collector.connection().system_service() \
+        .domains_service()
     domains_list = domains_service.list()
     for domain in domains_list:
         domains.append(domain.name)
     return domains
 
 
-def _get_vnic_profile_mapping(connection):
-    networks = []
-    vnic_profiles_service = connection.system_service().vnic_profiles_service()
-    vnic_profile_list = vnic_profiles_service.list()
-    for vnic_profile_item in vnic_profile_list:
-        mapped_network = {}
-        networks_list = connection.system_service().networks_service().list()
-        network_name = ''
-        for network_item in networks_list:
-            if network_item.id == vnic_profile_item.network.id:
-                network_name = network_item.name
-                dc_name = connection.system_service().data_centers_service(). \
-                    data_center_service(network_item.data_center.id). \
-                    get()._name
-                break
-        mapped_network['network_name'] = network_name
-        mapped_network['network_dc'] = dc_name
-        mapped_network['profile_name'] = vnic_profile_item.name
-        mapped_network['profile_id'] = vnic_profile_item.id
-        networks.append(mapped_network)
-    return networks
-
-
-def _add_clusters_and_aff_groups_for_dc(dc_service, clusters, affinity_groups):
-    clusters_service = dc_service.clusters_service()
-    attached_clusters_list = clusters_service.list()
-    for cluster in attached_clusters_list:
-        clusters.append(cluster.name)
-        cluster_service = clusters_service.cluster_service(cluster.id)
-        _add_affinity_groups_for_cluster(cluster_service, affinity_groups)
-
-
-def _add_affinity_groups_for_cluster(cluster_service, affinity_groups):
-    affinity_groups_service = cluster_service.affinity_groups_service()
-    for affinity_group in affinity_groups_service.list():
-        affinity_groups.append(affinity_group.name)
-
-
-def _write_attached_storage_domains(f, dc_service, dc):
+def _get_vnic_profile_mapping(collector):
+    return get_vnic_profile_mapping(collector.connection())
+
+
+def _write_attached_storage_domains(f, dc, attached_sds_list):
     """
     Add all the attached storage domains to the var file
     """
-    # Locate the service that manages the storage domains that are attached
-    # to the data centers:
-    attached_sds_service = dc_service.storage_domains_service()
-    attached_sds_list = attached_sds_service.list()
     for attached_sd in attached_sds_list:
         if attached_sd.name == 'hosted_storage':
             f.write("# Hosted storage should not be part of the "
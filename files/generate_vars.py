@@ -14,6 +14,8 @@ from ansible.module_utils.six.moves import input
 import ovirtsdk4 as sdk
 
 from bcolors import bcolors
+from inventory import read_snapshot_conf
+from playbook_runner import LogFile, run_playbook
 
 
 INFO = bcolors.OKGREEN
@@ -30,7 +32,7 @@ PLAY_DEF = "../examples/dr_play.yml"
 
 class GenerateMappingFile:
 
-    def run(self, conf_file, log_file, log_level):
+    def run(self, conf_file, log_file, log_level, refresh=False):
         log = self._set_log(log_file, log_level)
         log.info("Start generate variable mapping file "
                  "for oVirt ansible disaster recovery")
@@ -51,8 +53,13 @@ class GenerateMappingFile:
                                          ca_file):
             self._print_error(log)
             sys.exit()
-        extra_vars = "site={0} username={1} password={2} ca={3} var_file={4}".\
-            format(site, username, password, ca_file, var_file_path)
+        snapshot_dir, snapshot_ttl = read_snapshot_conf(conf_file)
+        extra_vars = "site={0} username={1} password={2} ca={3} " \
+                     "var_file={4} dr_inventory_snapshot_dir={5} " \
+                     "dr_inventory_snapshot_ttl={6} " \
+                     "dr_inventory_refresh={7}".\
+            format(site, username, password, ca_file, var_file_path,
+                   snapshot_dir, snapshot_ttl, refresh)
         command = [
             "ansible-playbook", ansible_play,
             "-t", dr_tag,
@@ -61,7 +68,7 @@ class GenerateMappingFile:
         ]
         log.info("Executing command %s", ' '.join(map(str, command)))
         if log_file is not None and log_file != '':
-            self._log_to_file(log_file, command)
+            self._log_to_file(log_file, command, log)
         else:
             self._log_to_console(command, log)
 
@@ -72,27 +79,26 @@ class GenerateMappingFile:
         log.info("Var file location: '%s'", var_file_path)
         self._print_success(log)
 
-    def _log_to_file(self, log_file, command):
-        with open(log_file, "a") as f:
-            proc = subprocess.Popen(command,
-                                    stdout=subprocess.PIPE,
-                                    stderr=subprocess.PIPE,
-                                    universal_newlines=True)
-            for line in iter(proc.stdout.readline, ''):
-                f.write(line)
-            for line in iter(proc.stderr.readline, ''):
+    def _log_to_file(self, log_file, command, log):
+        with LogFile(log_file) as f:
+            def _stderr(line):
                 f.write(line)
                 print("%s%s%s" % (FAIL, line, END))
 
+            result = run_playbook(command, f.write, _stderr)
+        self._handle_result(result, log)
+
     def _log_to_console(self, command, log):
-        proc = subprocess.Popen(command,
-                                stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,
-                                universal_newlines=True)
-        for line in iter(proc.stdout.readline, ''):
-            log.debug(line)
-        for line in iter(proc.stderr.readline, ''):
-            log.error(line)
+        result = run_playbook(command, log.debug, log.error)
+        self._handle_result(result, log)
+
+    def _handle_result(self, result, log):
+        try:
+            result.check_returncode()
+        except subprocess.CalledProcessError as e:
+            log.error("Error: %s", e)
+            self._print_error(log)
+            sys.exit()
 
     def _set_log(self, log_file, log_level):
         logger = logging.getLogger(PREFIX)
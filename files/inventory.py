@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import time
+
+from configparser import ConfigParser
+
+# Seconds a snapshot of the inventory of a setup is used for by default.
+DEFAULT_SNAPSHOT_TTL = 600
+DEFAULT_SNAPSHOT_DIR = "/var/lib/ovirt-ansible-disaster-recovery/inventory"
+
+# The collections of a setup which are kept in its snapshot.
+SNAPSHOT_KEYS = ('clusters', 'affinity_groups', 'affinity_labels',
+                 'aaa_domains', 'vnic_profiles')
+
+
+def get_vnic_profile_mapping(connection):
+    """
+    Return the network name, data center name, profile name and profile ID
+    of every vNIC profile of the setup.
+
+    The networks and data centers are fetched once and indexed by ID, so
+    the number of requests does not depend on the number of profiles.
+    """
+    system_service = connection.system_service()
+    networks = dict((network.id, network) for network in
+                    system_service.networks_service().list())
+    dc_names = dict((dc.id, dc.name) for dc in
+                    system_service.data_centers_service().list())
+    mapping = []
+    for vnic_profile in system_service.vnic_profiles_service().list():
+        network = networks.get(vnic_profile.network.id)
+        network_name = ''
+        dc_name = ''
+        if network is not None:
+            network_name = network.name
+            dc_name = dc_names.get(network.data_center.id, '')
+        mapping.append({
+            'network_name': network_name,
+            'network_dc': dc_name,
+            'profile_name': vnic_profile.name,
+            'profile_id': vnic_profile.id,
+        })
+    return mapping
+
+
+def search_pages(service, search, page_size):
+    """
+    Yield the entities of a collection service which match the search,
+    fetching a page of 'page_size' entities at a time, so only one page is
+    held in memory.
+    """
+    page = 1
+    while True:
+        entities = service.list(search='%s page %d' % (search, page),
+                                max=page_size)
+        for entity in entities:
+            yield entity
+        if len(entities) < page_size:
+            return
+        page += 1
+
+
+def get_inventory(connection):
+    """
+    Return the names of the clusters, affinity groups, affinity labels and
+    AAA domains, and the vNIC profile mapping of the setup, which is the
+    inventory kept in a snapshot.
+    """
+    system_service = connection.system_service()
+    clusters, affinity_groups = get_clusters(connection)
+    return {
+        'clusters': clusters,
+        'affinity_groups': affinity_groups,
+        'affinity_labels': [affinity_label.name for affinity_label in
+                            system_service.affinity_labels_service().list()],
+        'aaa_domains': [domain.name for domain in
+                        system_service.domains_service().list()],
+        'vnic_profiles': get_vnic_profile_mapping(connection),
+    }
+
+
+def get_clusters(connection):
+    """
+    Return the names of the clusters and of the affinity groups of the
+    setup. The affinity groups are followed from the clusters, so a single
+    request is sent whatever the number of clusters.
+    """
+    clusters = connection.system_service().clusters_service() \
+        .list(follow='affinity_groups')
+    return ([cluster.name for cluster in clusters],
+            [affinity_group.name for cluster in clusters
+             for affinity_group in cluster.affinity_groups or []])
+
+
+def read_snapshot_conf(conf_file):
+    """
+    Return the snapshot directory and TTL of the [inventory] section of the
+    configuration file. An empty directory disables the snapshots.
+    """
+    _SECTION = 'inventory'
+    settings = ConfigParser()
+    settings.read(conf_file)
+    snapshot_dir = DEFAULT_SNAPSHOT_DIR
+    ttl = DEFAULT_SNAPSHOT_TTL
+    if settings.has_option(_SECTION, 'snapshot_dir'):
+        snapshot_dir = settings.get(_SECTION, 'snapshot_dir')
+    if settings.has_option(_SECTION, 'snapshot_ttl'):
+        ttl = settings.getint(_SECTION, 'snapshot_ttl')
+    return snapshot_dir, ttl
+
+
+def _snapshot_file(snapshot_dir, url):
+    return os.path.join(
+        snapshot_dir,
+        hashlib.sha1(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def load_snapshot(snapshot_dir, url, ttl):
+    """
+    Return the inventory of the setup of the engine URL out of its
+    snapshot, or None if there is no snapshot younger than 'ttl' seconds.
+    """
+    if not snapshot_dir:
+        return None
+    try:
+        with open(_snapshot_file(snapshot_dir, url)) as f:
+            snapshot = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if snapshot.get('url') != url or \
+            time.time() - snapshot.get('time', 0) >= ttl:
+        return None
+    return snapshot['inventory']
+
+
+def save_snapshot(snapshot_dir, url, inventory):
+    """
+    Write the inventory of the setup of the engine URL to its snapshot.
+    A snapshot which can not be written is skipped, since it is only used
+    to save requests.
+    """
+    if not snapshot_dir:
+        return
+    snapshot = {
+        'url': url,
+        'time': time.time(),
+        'inventory': dict((key, inventory[key]) for key in SNAPSHOT_KEYS),
+    }
+    path = _snapshot_file(snapshot_dir, url)
+    try:
+        if not os.path.isdir(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        # Write to a temporary file first, so a reader never sees a partial
+        # snapshot.
+        with open(path + '.tmp', 'w') as f:
+            json.dump(snapshot, f, separators=(',', ':'))
+        os.rename(path + '.tmp', path)
+    except (IOError, OSError):
+        pass
+
+
+def invalidate_snapshot(snapshot_dir, url):
+    """
+    Remove the snapshot of the setup of the engine URL, if any.
+    """
+    if not snapshot_dir:
+        return
+    try:
+        os.remove(_snapshot_file(snapshot_dir, url))
+    except OSError:
+        pass
@@ -0,0 +1,162 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+
+from collections import namedtuple
+
+import pytest
+
+import inventory
+from inventory import (get_clusters, get_vnic_profile_mapping,
+                       invalidate_snapshot, load_snapshot, save_snapshot,
+                       search_pages)
+
+Entity = namedtuple('Entity', ['id', 'name', 'network', 'data_center'])
+Cluster = namedtuple('Cluster', ['name', 'affinity_groups'])
+
+
+class FakeListService:
+
+    def __init__(self, connection, entities):
+        self._connection = connection
+        self._entities = entities
+
+    def list(self, **kwargs):
+        self._connection.calls += 1
+        return list(self._entities)
+
+
+class FakeConnection:
+    """
+    A connection to a setup with one network per data center and the
+    given number of vNIC profiles spread over the networks, which counts
+    the requests it gets.
+    """
+
+    def __init__(self, profiles, dcs=4):
+        self.calls = 0
+        self.dcs = [Entity('dc-%d' % i, 'DC%d' % i, None, None)
+                    for i in range(dcs)]
+        self.networks = [Entity('net-%d' % i, 'net%d' % i, None, dc)
+                         for i, dc in enumerate(self.dcs)]
+        self.profiles = [
+            Entity('profile-%d' % i, 'profile%d' % i,
+                   self.networks[i % dcs], None)
+            for i in range(profiles)
+        ]
+
+    def system_service(self):
+        return self
+
+    def data_centers_service(self):
+        return FakeListService(self, self.dcs)
+
+    def networks_service(self):
+        return FakeListService(self, self.networks)
+
+    def vnic_profiles_service(self):
+        return FakeListService(self, self.profiles)
+
+    def clusters_service(self):
+        return FakeListService(self, self.clusters)
+
+
+@pytest.mark.parametrize("profiles", [1, 10, 1000])
+def test_calls_do_not_grow_with_profiles(profiles):
+    connection = FakeConnection(profiles)
+    get_vnic_profile_mapping(connection)
+    assert connection.calls == 3
+
+
+def test_profiles_are_resolved_to_network_and_dc():
+    connection = FakeConnection(profiles=6, dcs=3)
+    mapping = get_vnic_profile_mapping(connection)
+    assert mapping[4] == {
+        'network_name': 'net1',
+        'network_dc': 'DC1',
+        'profile_name': 'profile4',
+        'profile_id': 'profile-4',
+    }
+
+
+def test_profile_of_unknown_network():
+    connection = FakeConnection(profiles=1)
+    connection.networks = []
+    mapping = get_vnic_profile_mapping(connection)
+    assert mapping[0]['network_name'] == ''
+    assert mapping[0]['network_dc'] == ''
+
+
+@pytest.mark.parametrize("clusters", [1, 10, 1000])
+def test_clusters_are_fetched_with_their_affinity_groups(clusters):
+    connection = FakeConnection(profiles=0)
+    connection.clusters = [
+        Cluster('cluster%d' % i,
+                [Entity(None, 'group%d' % i, None, None)] if i % 2 else None)
+        for i in range(clusters)
+    ]
+    names, affinity_groups = get_clusters(connection)
+    assert connection.calls == 1
+    assert names == ['cluster%d' % i for i in range(clusters)]
+    assert affinity_groups == ['group%d' % i for i in range(1, clusters, 2)]
+
+
+class FakePagedService:
+
+    def __init__(self, count):
+        self.count = count
+        self.searches = []
+
+    def list(self, search=None, max=None):
+        self.searches.append(search)
+        page = int(search.rsplit(' ', 1)[1])
+        start = (page - 1) * max
+        return list(range(start, min(start + max, self.count)))
+
+
+@pytest.mark.parametrize("count,pages", [(0, 1), (5, 1), (10, 2), (25, 3)])
+def test_search_pages(count, pages):
+    service = FakePagedService(count)
+    assert list(search_pages(service, 'disk_type=lun', 10)) == \
+        list(range(count))
+    assert service.searches == ['disk_type=lun page %d' % page
+                                for page in range(1, pages + 1)]
+
+
+URL = 'https://engine.example.com/ovirt-engine/api'
+SNAPSHOT = {
+    'clusters': ['Default'],
+    'affinity_groups': ['group'],
+    'affinity_labels': ['label'],
+    'aaa_domains': ['internal-authz'],
+    'vnic_profiles': [{'network_name': 'ovirtmgmt', 'network_dc': 'Default',
+                       'profile_name': 'ovirtmgmt', 'profile_id': 'id'}],
+}
+
+
+def test_snapshot_is_loaded_while_fresh(tmpdir):
+    save_snapshot(str(tmpdir), URL, dict(SNAPSHOT, data_centers=[]))
+    assert load_snapshot(str(tmpdir), URL, 600) == SNAPSHOT
+    assert load_snapshot(str(tmpdir), URL + '/other', 600) is None
+
+
+def test_stale_snapshot_is_not_loaded(tmpdir, monkeypatch):
+    save_snapshot(str(tmpdir), URL, SNAPSHOT)
+    now = time.time()
+    monkeypatch.setattr(inventory.time, 'time', lambda: now + 601)
+    assert load_snapshot(str(tmpdir), URL, 600) is None
+
+
+def test_invalidated_snapshot_is_not_loaded(tmpdir):
+    save_snapshot(str(tmpdir), URL, SNAPSHOT)
+    invalidate_snapshot(str(tmpdir), URL)
+    assert load_snapshot(str(tmpdir), URL, 600) is None
+
+
+def test_snapshots_are_disabled_without_dir(tmpdir):
+    save_snapshot('', URL, SNAPSHOT)
+    assert load_snapshot('', URL, 600) is None
+    assert tmpdir.listdir() == []
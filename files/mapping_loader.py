@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import glob
+import hashlib
+import json
+import os
+import stat
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# The sections of a mapping var file which hold a value.
+SCALAR_SECTIONS = (
+    'dr_sites_primary_url',
+    'dr_sites_primary_username',
+    'dr_sites_primary_ca_file',
+    'dr_sites_secondary_url',
+    'dr_sites_secondary_username',
+    'dr_sites_secondary_ca_file',
+)
+
+# The sections of a mapping var file which hold a list of mappings, and the
+# keys every mapping must have, even if left empty.
+LIST_SECTIONS = {
+    'dr_import_storages': ('dr_domain_type', 'dr_primary_name'),
+    'dr_cluster_mappings': ('primary_name', 'secondary_name'),
+    'dr_affinity_group_mappings': ('primary_name', 'secondary_name'),
+    'dr_affinity_label_mappings': ('primary_name', 'secondary_name'),
+    'dr_domain_mappings': ('primary_name', 'secondary_name'),
+    'dr_role_mappings': ('primary_name', 'secondary_name'),
+    'dr_network_mappings': ('primary_network_name', 'primary_profile_name',
+                            'secondary_network_name',
+                            'secondary_profile_name'),
+    'dr_lun_mappings': ('primary_logical_unit_id',
+                        'secondary_logical_unit_id'),
+}
+
+VAULT_HEADER = b'$ANSIBLE_VAULT'
+
+
+def sidecar_path(path, digest):
+    """
+    Return the path of the JSON sidecar of the mapping var file for the
+    given SHA-1 digest of its content.
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, '.%s.%s.json' % (name, digest))
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    return content, hashlib.sha1(content).hexdigest()
+
+
+def _compile(path, content, digest):
+    """
+    Parse the YAML content of the mapping var file and write its sidecar,
+    replacing the sidecars of former contents. Return the vars and the
+    path of the sidecar, which is None if it could not be written.
+    """
+    mapping_vars = yaml.load(content, Loader=SafeLoader)
+    sidecar = sidecar_path(path, digest)
+    tmp = sidecar + '.tmp'
+    try:
+        # Write to a temporary file first, so a reader never sees a partial
+        # sidecar. The sidecar holds the passwords of the var file, so it
+        # is only readable by whom may read the var file.
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            os.fchmod(f.fileno(), stat.S_IMODE(os.stat(path).st_mode))
+            json.dump(mapping_vars, f, separators=(',', ':'))
+        os.rename(tmp, sidecar)
+    except (IOError, OSError, TypeError, ValueError):
+        # Values which JSON can not hold, such as dates, are kept in YAML.
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        return mapping_vars, None
+    for former in glob.glob(sidecar_path(path, '*')):
+        if former != sidecar:
+            try:
+                os.remove(former)
+            except OSError:
+                pass
+    return mapping_vars, sidecar
+
+
+def load_mapping_file(path):
+    """
+    Return the vars of the mapping var file, out of its sidecar if one was
+    compiled from the same content, or parsing the YAML and compiling the
+    sidecar otherwise.
+    """
+    content, digest = _read(path)
+    try:
+        with open(sidecar_path(path, digest)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        pass
+    return _compile(path, content, digest)[0]
+
+
+def compiled_mapping_file(path):
+    """
+    Return the path of the sidecar of the mapping var file, which ansible
+    loads faster than the YAML file, compiling it if needed. Return the
+    path of the mapping var file itself if it is vault encrypted, or can
+    not be compiled.
+    """
+    content, digest = _read(path)
+    if content.startswith(VAULT_HEADER):
+        return path
+    sidecar = sidecar_path(path, digest)
+    if os.path.isfile(sidecar):
+        return sidecar
+    try:
+        return _compile(path, content, digest)[1] or path
+    except yaml.YAMLError:
+        return path
+
+
+def check_schema(mapping_vars):
+    """
+    Return the list of the errors of the mapping vars against the declared
+    sections of a mapping var file.
+    """
+    if not isinstance(mapping_vars, dict):
+        return ["The mapping var file does not hold a mapping of vars"]
+    errors = []
+    for section in SCALAR_SECTIONS:
+        value = mapping_vars.get(section)
+        if isinstance(value, (dict, list)):
+            errors.append("%s is not a value: '%s'" % (section, value))
+    for section, keys in sorted(LIST_SECTIONS.items()):
+        mappings = mapping_vars.get(section)
+        if mappings is None:
+            continue
+        if not isinstance(mappings, list):
+            errors.append("%s is not a list: '%s'" % (section, mappings))
+            continue
+        for index, mapping in enumerate(mappings):
+            if not isinstance(mapping, dict):
+                errors.append("%s[%d] is not a mapping: '%s'"
+                              % (section, index, mapping))
+                continue
+            missing = [key for key in keys if key not in mapping]
+            if missing:
+                errors.append("%s[%d] misses %s"
+                              % (section, index, ', '.join(missing)))
+    return errors
@@ -0,0 +1,99 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+
+import pytest
+
+import mapping_loader
+from mapping_loader import (check_schema, compiled_mapping_file,
+                            load_mapping_file)
+
+MAPPING_FILE = """---
+dr_sites_primary_url: https://engine1.example.com/ovirt-engine/api
+dr_cluster_mappings:
+- primary_name: prod
+  secondary_name: recovery
+dr_lun_mappings:
+"""
+
+
+def _fail_to_parse(*args, **kwargs):
+    raise AssertionError("The YAML was parsed again")
+
+
+def test_sidecar_is_loaded_instead_of_yaml(tmpdir, monkeypatch):
+    var_file = tmpdir.join('mapping_vars.yml')
+    var_file.write(MAPPING_FILE)
+    mapping_vars = load_mapping_file(str(var_file))
+    assert mapping_vars['dr_cluster_mappings'][0]['secondary_name'] == \
+        'recovery'
+
+    monkeypatch.setattr(mapping_loader.yaml, 'load', _fail_to_parse)
+    assert load_mapping_file(str(var_file)) == mapping_vars
+    sidecar = compiled_mapping_file(str(var_file))
+    assert sidecar != str(var_file)
+    with open(sidecar) as f:
+        assert json.load(f) == mapping_vars
+
+
+def test_changed_file_replaces_its_sidecar(tmpdir):
+    var_file = tmpdir.join('mapping_vars.yml')
+    var_file.write(MAPPING_FILE)
+    former = compiled_mapping_file(str(var_file))
+    var_file.write(MAPPING_FILE.replace('recovery', 'backup'))
+    mapping_vars = load_mapping_file(str(var_file))
+    assert mapping_vars['dr_cluster_mappings'][0]['secondary_name'] == \
+        'backup'
+    assert len(tmpdir.listdir(lambda path: path.ext == '.json')) == 1
+    assert compiled_mapping_file(str(var_file)) != former
+
+
+def test_sidecar_keeps_the_mode_of_the_var_file(tmpdir):
+    var_file = tmpdir.join('mapping_vars.yml')
+    var_file.write(MAPPING_FILE)
+    os.chmod(str(var_file), 0o600)
+    sidecar = compiled_mapping_file(str(var_file))
+    assert sidecar != str(var_file)
+    assert os.stat(sidecar).st_mode & 0o777 == 0o600
+
+
+def test_file_which_json_can_not_hold_leaves_no_sidecar(tmpdir):
+    var_file = tmpdir.join('mapping_vars.yml')
+    var_file.write(MAPPING_FILE + 'dr_date: 2020-01-01\n')
+    assert compiled_mapping_file(str(var_file)) == str(var_file)
+    assert load_mapping_file(str(var_file))['dr_date'].year == 2020
+    assert [path.basename for path in tmpdir.listdir()] == \
+        ['mapping_vars.yml']
+
+
+def test_vault_encrypted_file_is_not_compiled(tmpdir):
+    var_file = tmpdir.join('mapping_vars.yml')
+    var_file.write('$ANSIBLE_VAULT;1.1;AES256\n6162\n')
+    assert compiled_mapping_file(str(var_file)) == str(var_file)
+
+
+@pytest.mark.parametrize("mapping_vars,error", [
+    ({'dr_cluster_mappings': 'prod'},
+     "dr_cluster_mappings is not a list: 'prod'"),
+    ({'dr_network_mappings': ['ovirtmgmt']},
+     "dr_network_mappings[0] is not a mapping: 'ovirtmgmt'"),
+    ({'dr_lun_mappings': [{'primary_logical_unit_id': 'lun'}]},
+     "dr_lun_mappings[0] misses secondary_logical_unit_id"),
+    ({'dr_sites_primary_url': ['url']},
+     "dr_sites_primary_url is not a value: '['url']'"),
+])
+def test_schema_errors(mapping_vars, error):
+    assert check_schema(mapping_vars) == [error]
+
+
+def test_example_file_matches_schema(tmpdir):
+    example = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'examples', 'disaster_recovery_vars.yml')
+    var_file = tmpdir.join('mapping_vars.yml')
+    with open(example) as f:
+        var_file.write(f.read())
+    assert check_schema(load_mapping_file(str(var_file))) == []
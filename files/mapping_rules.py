@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from collections import namedtuple
+
+Violation = namedtuple('Violation', ['section', 'index', 'message'])
+
+
+class UniqueRule:
+    """
+    The entries of a mapping section must not share a key on either side.
+
+    The key of an entry on a side is made of the values of its 'fields',
+    prefixed by the side, and of its 'optional' fields, which are empty if
+    missing. An entry with unset fields has no key on that side, which is
+    a violation if the rule is 'required'.
+    """
+
+    def __init__(self, name, section, fields, optional=(),
+                 sides=('primary_', 'secondary_'), required=False):
+        self.name = name
+        self.section = section
+        self.fields = fields
+        self.optional = optional
+        self.sides = sides
+        self.required = required
+
+    def check(self, entries):
+        """
+        Yield a Violation for every entry whose key on a side was already
+        used by a former entry, and for every entry with unset fields if
+        the rule is required.
+        """
+        first = [{} for side in self.sides]
+        for index, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                yield Violation(self.section, index,
+                                "'%s' is not a mapping" % (entry,))
+                continue
+            for side, seen in zip(self.sides, first):
+                unset = [side + field for field in self.fields
+                         if entry.get(side + field) is None]
+                if unset:
+                    if self.required:
+                        yield Violation(self.section, index,
+                                        "%s is not initialized"
+                                        % ', '.join(unset))
+                    continue
+                key = tuple(entry[side + field] for field in self.fields) + \
+                    tuple(entry.get(side + field) or ''
+                          for field in self.optional)
+                if key in seen:
+                    yield Violation(
+                        self.section, index,
+                        "duplicate %s key '%s', already used by %s[%d]"
+                        % (side.rstrip('_'),
+                           '_'.join(str(value) for value in key),
+                           self.section, seen[key]))
+                else:
+                    seen[key] = index
+
+
+RULES = (
+    UniqueRule('clusters', 'dr_cluster_mappings', ('name',)),
+    UniqueRule('domains', 'dr_import_storages', ('name',),
+               sides=('dr_primary_', 'dr_secondary_')),
+    UniqueRule('roles', 'dr_role_mappings', ('name',)),
+    UniqueRule('aff_groups', 'dr_affinity_group_mappings', ('name',)),
+    UniqueRule('aff_labels', 'dr_affinity_label_mappings', ('name',)),
+    UniqueRule('network', 'dr_network_mappings',
+               ('profile_name', 'network_name'), optional=('network_dc',),
+               required=True),
+    UniqueRule('luns', 'dr_lun_mappings', ('logical_unit_id',)),
+)
+
+
+def check_mappings(var_file, rules=RULES):
+    """
+    Return the violations of the rules by the mapping sections of the var
+    file, walking every section once.
+    """
+    violations = []
+    for rule in rules:
+        violations.extend(rule.check(var_file.get(rule.section) or []))
+    return violations
+
+
+def duplicates(keys):
+    """
+    Return the set of the keys which appear more than once.
+    """
+    seen = set()
+    dups = set()
+    for key in keys:
+        if key in seen:
+            dups.add(key)
+        else:
+            seen.add(key)
+    return dups
@@ -0,0 +1,77 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from mapping_rules import Violation, check_mappings, duplicates
+
+
+def _network(primary, secondary, dc=None):
+    mapping = {
+        'primary_profile_name': primary,
+        'primary_network_name': 'net',
+        'secondary_profile_name': secondary,
+        'secondary_network_name': 'net',
+    }
+    if dc is not None:
+        mapping['secondary_network_dc'] = dc
+    return mapping
+
+
+def test_valid_mappings():
+    var_file = {
+        'dr_cluster_mappings': [
+            {'primary_name': 'a', 'secondary_name': 'a'},
+            {'primary_name': 'b', 'secondary_name': 'b'},
+        ],
+        'dr_import_storages': [
+            {'dr_primary_name': 'a', 'dr_secondary_name': 'b'},
+        ],
+        'dr_network_mappings': [
+            _network('p', 'p', dc='dc1'),
+            _network('p2', 'p', dc='dc2'),
+        ],
+        # Placeholders of a generated file are not duplicates.
+        'dr_role_mappings': [{'primary_name': None, 'secondary_name': None}],
+    }
+    assert check_mappings(var_file) == []
+
+
+def test_every_violation_is_reported():
+    var_file = {
+        'dr_cluster_mappings': [
+            {'primary_name': 'a', 'secondary_name': 'a'},
+            {'primary_name': 'a', 'secondary_name': 'b'},
+            {'primary_name': 'c', 'secondary_name': 'b'},
+        ],
+        'dr_network_mappings': [
+            _network('p', 'p'),
+            _network(None, 'p2'),
+            _network('p', 'p3'),
+        ],
+        'dr_lun_mappings': [
+            {'primary_logical_unit_id': 'lun',
+             'secondary_logical_unit_id': 'lun'},
+            {'primary_logical_unit_id': 'lun',
+             'secondary_logical_unit_id': 'lun2'},
+        ],
+    }
+    violations = check_mappings(var_file)
+    assert [(violation.section, violation.index)
+            for violation in violations] == [
+        ('dr_cluster_mappings', 1),
+        ('dr_cluster_mappings', 2),
+        ('dr_network_mappings', 1),
+        ('dr_network_mappings', 2),
+        ('dr_lun_mappings', 1),
+    ]
+    assert violations[0] == Violation(
+        'dr_cluster_mappings', 1,
+        "duplicate primary key 'a', already used by dr_cluster_mappings[0]")
+    assert violations[2].message == \
+        'primary_profile_name is not initialized'
+
+
+def test_duplicates():
+    assert duplicates(['a', 'b', 'a', 'c', 'a']) == {'a'}
+    assert duplicates(range(1000)) == set()
@@ -0,0 +1,362 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import codecs
+import collections
+import json
+import os
+import selectors
+import subprocess
+import sys
+import time
+import traceback
+
+from bcolors import bcolors
+
+# Size of a single read from a playbook pipe.
+READ_SIZE = 64 * 1024
+# Longest line kept in memory. Longer lines (for example a full result
+# dump of a big task) are passed to the handler in chunks of this size.
+MAX_LINE = 64 * 1024
+# Number of trailing stderr lines kept for the failure report.
+STDERR_TAIL = 200
+# Seconds between two flushes of the log file.
+FLUSH_INTERVAL = 1.0
+LOG_BUFFER_SIZE = 1024 * 1024
+# Format of the task events written by the role's stdout callback plugin.
+CALLBACK_FORMAT_ENV = "DR_CALLBACK_FORMAT"
+CALLBACK_FORMATS = ['json', 'verbose']
+EVENT_PREFIX = '{"event":'
+# Ways to execute the playbook: a new ansible-playbook process per phase,
+# or a child forked from a process which already loaded Ansible.
+EXECUTORS = ['subprocess', 'inprocess']
+
+
+class LogFile:
+    """
+    Append-only log file which is flushed in batches instead of per line.
+
+    Lines are collected in a large write buffer and flushed once the
+    buffer is full or FLUSH_INTERVAL seconds passed since the last flush,
+    so a 'tail -f' on the log still follows the operation.
+    """
+
+    def __init__(self, log_file, flush_interval=FLUSH_INTERVAL):
+        self._file = open(log_file, "a", buffering=LOG_BUFFER_SIZE)
+        self._flush_interval = flush_interval
+        self._last_flush = time.time()
+
+    def write(self, line):
+        self._file.write(line)
+        now = time.time()
+        if now - self._last_flush >= self._flush_interval:
+            self._file.flush()
+            self._last_flush = now
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class OutputPump:
+    """
+    Multiplex the output pipes of a process line by line.
+
+    All the registered pipes are read as soon as data is available, so a
+    chatty stream can never fill its pipe and block the process while the
+    other stream is being read.
+    """
+
+    def __init__(self, max_line=MAX_LINE):
+        self._max_line = max_line
+        self._selector = selectors.DefaultSelector()
+        self._streams = {}
+
+    def register(self, pipe, handler):
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._streams[pipe.fileno()] = [handler, decoder, '']
+        self._selector.register(pipe, selectors.EVENT_READ)
+
+    def run(self):
+        while self._selector.get_map():
+            for key, _ in self._selector.select():
+                data = os.read(key.fd, READ_SIZE)
+                if data:
+                    self._feed(key.fd, data)
+                else:
+                    self._close(key)
+        self._selector.close()
+
+    def _feed(self, fd, data):
+        stream = self._streams[fd]
+        handler, decoder, pending = stream
+        pending += decoder.decode(data)
+        start = 0
+        end = pending.find('\n')
+        while end >= 0:
+            handler(pending[start:end + 1])
+            start = end + 1
+            end = pending.find('\n', start)
+        while len(pending) - start >= self._max_line:
+            handler(pending[start:start + self._max_line])
+            start += self._max_line
+        stream[2] = pending[start:]
+
+    def _close(self, key):
+        handler, decoder, pending = self._streams.pop(key.fd)
+        pending += decoder.decode(b'', final=True)
+        if pending:
+            handler(pending)
+        self._selector.unregister(key.fileobj)
+        key.fileobj.close()
+
+
+def playbook_output_args(callback_format):
+    """
+    Return the extra ansible-playbook arguments for the given format of
+    the stdout callback events. The full -vvv result dumps are only
+    requested in verbose format.
+    """
+    if callback_format == 'verbose':
+        return ["-vvv"]
+    return []
+
+
+def parse_event(line):
+    """
+    Return the JSON event written by the stdout callback plugin, or None
+    if the line is plain ansible-playbook output.
+    """
+    if not line.startswith(EVENT_PREFIX):
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def format_event(event):
+    if event['event'] == 'task_start':
+        return "TASK [%s]" % event['task']
+    msg = "%s: %s" % (event['status'].upper(), event['task'])
+    if event.get('entity'):
+        msg += " [%s]" % event['entity']
+    if event.get('duration') is not None:
+        msg += " (%.2fs)" % event['duration']
+    if event.get('error'):
+        msg += " %s" % event['error']
+    return msg
+
+
+def print_event(event):
+    """
+    Print the task starts and the failed tasks of the playbook to the
+    console.
+    """
+    if event['event'] == 'task_start':
+        print("\n%s%s%s\n"
+              % (bcolors.OKGREEN, format_event(event), bcolors.ENDC))
+    elif event.get('status') in ('failed', 'unreachable'):
+        print("%s%s%s" % (bcolors.WARNING, format_event(event), bcolors.ENDC))
+
+
+def check_result(result, operation):
+    """
+    Exit if the playbook run of the operation failed, pointing the user
+    at the log file.
+    """
+    try:
+        result.check_returncode()
+    except subprocess.CalledProcessError as e:
+        print("%sException: %s\n\n"
+              "%s operation failed, please check log file for "
+              "further details.%s"
+              % (bcolors.FAIL, e, operation, bcolors.ENDC))
+        sys.exit()
+
+
+class PlaybookResult(subprocess.CompletedProcess):
+    """
+    Outcome of a single playbook run.
+
+    Besides the exit code and the stderr tail, it holds the number of
+    seconds until the first task started (the time spent on starting
+    Ansible, parsing the play and decrypting the vault) and the total
+    duration of the run.
+    """
+
+    def __init__(self, args, returncode, stderr, startup, duration):
+        super(PlaybookResult, self).__init__(args, returncode, stderr=stderr)
+        self.startup = startup
+        self.duration = duration
+
+
+def _pump_playbook(command, stdout, stderr, stdout_handler, stderr_handler,
+                   wait, start):
+    stderr_tail = collections.deque(maxlen=STDERR_TAIL)
+    first_task = []
+
+    def _stdout(line):
+        if not first_task and ('TASK [' in line or '"task_start"' in line):
+            first_task.append(time.time())
+        stdout_handler(line)
+
+    def _stderr(line):
+        stderr_tail.append(line)
+        stderr_handler(line)
+
+    pump = OutputPump()
+    pump.register(stdout, _stdout)
+    pump.register(stderr, _stderr)
+    pump.run()
+    returncode = wait()
+    end = time.time()
+    startup = first_task[0] - start if first_task else None
+    return PlaybookResult(command,
+                          returncode,
+                          ''.join(stderr_tail),
+                          startup,
+                          end - start)
+
+
+def run_playbook(command, stdout_handler, stderr_handler,
+                 callback_format=None):
+    """
+    Execute the ansible-playbook command exactly once.
+
+    Every line of the playbook output is passed to the matching handler
+    while the process is running. The returned PlaybookResult holds the
+    exit code and the tail of the stderr of that single run, so the caller
+    can decide whether the operation succeeded without running the
+    playbook again.
+
+    If callback_format is set, the stdout callback plugin of the role is
+    asked to write its task events in that format.
+    """
+    env = None
+    if callback_format is not None:
+        env = dict(os.environ)
+        env[CALLBACK_FORMAT_ENV] = callback_format
+    start = time.time()
+    proc = subprocess.Popen(command,
+                            stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE,
+                            env=env)
+    return _pump_playbook(command, proc.stdout, proc.stderr,
+                          stdout_handler, stderr_handler, proc.wait, start)
+
+
+class InProcessPlaybook:
+    """
+    Run ansible-playbook commands without executing a new interpreter.
+
+    Ansible is imported, the var files are parsed and the vault is
+    decrypted once, when the object is created. Every command passed to
+    run() is then executed in a child forked from this process, so each
+    phase of an operation starts with all of that already in memory, while
+    the global Ansible state of one phase can not leak into the next.
+    """
+
+    def __init__(self, ansible_play, var_files, vault_pass):
+        from ansible import constants as C
+        from ansible import context
+        from ansible.cli.playbook import PlaybookCLI
+        from ansible.errors import AnsibleError
+        from ansible.executor.playbook_executor import PlaybookExecutor
+        from ansible.inventory.manager import InventoryManager
+        from ansible.module_utils._text import to_bytes
+        from ansible.parsing.dataloader import DataLoader
+        from ansible.parsing.vault import VaultSecret
+        from ansible.utils.display import Display
+        from ansible.vars.manager import VariableManager
+
+        start = time.time()
+        # The forked children use the executor classes loaded here instead
+        # of importing them again for every phase.
+        self._context = context
+        self._PlaybookCLI = PlaybookCLI
+        self._AnsibleError = AnsibleError
+        self._PlaybookExecutor = PlaybookExecutor
+        self._Display = Display
+        self._VariableManager = VariableManager
+        self._loader = DataLoader()
+        self._loader.set_vault_secrets(
+            [('default', VaultSecret(to_bytes(vault_pass)))])
+        self._loader.load_from_file(ansible_play)
+        for var_file in var_files:
+            self._loader.load_from_file(var_file)
+        self._inventory = InventoryManager(loader=self._loader,
+                                           sources=C.DEFAULT_HOST_LIST)
+        self.load_time = time.time() - start
+
+    def run(self, command, stdout_handler, stderr_handler,
+            callback_format=None):
+        """
+        Execute the ansible-playbook command in a forked child and return
+        the same PlaybookResult as run_playbook().
+        """
+        start = time.time()
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        # Do not let the child write the buffered output of this process.
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(stdout_r)
+            os.close(stderr_r)
+            os.dup2(stdout_w, 1)
+            os.dup2(stderr_w, 2)
+            if callback_format is not None:
+                os.environ[CALLBACK_FORMAT_ENV] = callback_format
+            returncode = 1
+            try:
+                returncode = self._execute(command)
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(returncode)
+        os.close(stdout_w)
+        os.close(stderr_w)
+
+        def _wait():
+            status = os.waitpid(pid, 0)[1]
+            if os.WIFSIGNALED(status):
+                return -os.WTERMSIG(status)
+            return os.WEXITSTATUS(status)
+
+        return _pump_playbook(command,
+                              os.fdopen(stdout_r, 'rb'),
+                              os.fdopen(stderr_r, 'rb'),
+                              stdout_handler,
+                              stderr_handler,
+                              _wait,
+                              start)
+
+    def _execute(self, command):
+        try:
+            # Only parse the command line, the loader of this process
+            # already holds the parsed var files and the vault secret.
+            self._PlaybookCLI(command).parse()
+            variable_manager = self._VariableManager(
+                loader=self._loader, inventory=self._inventory)
+            executor = self._PlaybookExecutor(
+                playbooks=self._context.CLIARGS['args'],
+                inventory=self._inventory,
+                variable_manager=variable_manager,
+                loader=self._loader,
+                passwords={'conn_pass': None, 'become_pass': None})
+            return executor.run()
+        except self._AnsibleError as e:
+            self._Display().error(e)
+            return 1
+        except Exception:
+            traceback.print_exc()
+            return 250
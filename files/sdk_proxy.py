@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import threading
+
+from ovirtsdk4.reader import Reader
+from ovirtsdk4.writer import Writer
+
+# The methods of the services whose responses are recorded.
+RECORDED_METHODS = ('list', 'get')
+
+
+class ReplayError(Exception):
+    pass
+
+
+class Recording:
+    """
+    The responses of the engines to the requests which were sent through a
+    recording Connection, so the same requests can be answered later by a
+    replaying Connection, without any engine.
+
+    Every entity is kept as the XML the SDK writes for it, and is read back
+    by the SDK, so replayed entities are of the same types as live ones.
+    """
+
+    def __init__(self, responses=None):
+        self._responses = responses or {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f)['responses'])
+
+    def save(self, path):
+        with self._lock:
+            with open(path, 'w') as f:
+                json.dump({'version': 1, 'responses': self._responses}, f,
+                          separators=(',', ':'))
+
+    def urls(self):
+        return list(self._responses)
+
+    def record(self, url, request, response):
+        if isinstance(response, list):
+            value = [Writer.write(entity) for entity in response]
+        elif response is not None:
+            value = Writer.write(response)
+        else:
+            value = None
+        with self._lock:
+            self._responses.setdefault(url, {})[request] = value
+
+    def replay(self, url, request):
+        try:
+            value = self._responses[url][request]
+        except KeyError:
+            raise ReplayError("The request '%s' to '%s' was not recorded"
+                              % (request, url))
+        if isinstance(value, list):
+            return [Reader.read(xml) for xml in value]
+        if value is not None:
+            return Reader.read(value)
+        return None
+
+
+class Connection:
+    """
+    A connection which counts the list and get requests sent through the
+    given SDK connection and records their responses, if a recording is
+    given, or replays them out of the recording if no SDK connection is
+    given.
+    """
+
+    def __init__(self, url, recording=None, connection=None):
+        self.url = url
+        self.recording = recording
+        self.requests = 0
+        self._connection = connection
+
+    def system_service(self):
+        service = None
+        if self._connection is not None:
+            service = self._connection.system_service()
+        return _Service(self, '', service)
+
+    def test(self, raise_exception=False):
+        if self._connection is None:
+            return True
+        return self._connection.test(raise_exception=raise_exception)
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+
+
+class _Service:
+
+    def __init__(self, connection, path, service):
+        self._connection = connection
+        self._path = path
+        self._service = service
+
+    def __getattr__(self, name):
+        if name.endswith('_service'):
+            return lambda *args: self._locate(name, args)
+        if name in RECORDED_METHODS:
+            return lambda **kwargs: self._call(name, kwargs)
+        if self._service is None:
+            raise ReplayError("Only the %s requests can be replayed, not "
+                              "'%s'" % (', '.join(RECORDED_METHODS), name))
+        return getattr(self._service, name)
+
+    def _locate(self, name, args):
+        service = None
+        if self._service is not None:
+            service = getattr(self._service, name)(*args)
+        path = '%s/%s(%s)' % (self._path, name,
+                              ','.join(str(arg) for arg in args))
+        return _Service(self._connection, path, service)
+
+    def _call(self, name, kwargs):
+        request = '%s.%s(%s)' % (
+            self._path, name,
+            ','.join('%s=%s' % item for item in sorted(kwargs.items())))
+        connection = self._connection
+        connection.requests += 1
+        if self._service is None:
+            return connection.recording.replay(connection.url, request)
+        response = getattr(self._service, name)(**kwargs)
+        if connection.recording is not None:
+            connection.recording.record(connection.url, request, response)
+        return response
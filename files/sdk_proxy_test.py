@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import pytest
+
+import ovirtsdk4.types as types
+
+from sdk_proxy import Connection, Recording, ReplayError
+
+URL = 'https://engine.example.com/ovirt-engine/api'
+
+
+class FakeService:
+
+    def __init__(self, calls, entities):
+        self._calls = calls
+        self._entities = entities
+
+    def list(self, search=None):
+        self._calls.append(search)
+        return [entity for entity in self._entities
+                if search is None or search == 'name=%s' % entity.name]
+
+    def get(self):
+        self._calls.append(None)
+        return self._entities[0]
+
+    def cluster_service(self, id):
+        return FakeService(self._calls, [entity for entity in self._entities
+                                         if entity.id == id])
+
+    def add(self, entity):
+        return entity
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.calls = []
+        self.clusters = [
+            types.Cluster(id='c-%d' % i, name='cluster%d' % i,
+                          version=types.Version(major=4, minor=i))
+            for i in range(3)
+        ]
+
+    def system_service(self):
+        return self
+
+    def clusters_service(self):
+        return FakeService(self.calls, self.clusters)
+
+    def close(self):
+        pass
+
+
+def _record(tmpdir):
+    recording = Recording()
+    connection = FakeConnection()
+    clusters_service = Connection(URL, recording, connection) \
+        .system_service().clusters_service()
+    clusters_service.list(search='name=cluster1')
+    clusters_service.list()
+    clusters_service.cluster_service('c-2').get()
+    path = str(tmpdir.join('responses.json'))
+    recording.save(path)
+    return connection, path
+
+
+def test_replay_without_connection(tmpdir):
+    connection, path = _record(tmpdir)
+    del connection.calls[:]
+    clusters_service = Connection(URL, Recording.load(path)) \
+        .system_service().clusters_service()
+    clusters = clusters_service.list()
+    assert [cluster.name for cluster in clusters] == \
+        ['cluster0', 'cluster1', 'cluster2']
+    assert isinstance(clusters[0], types.Cluster)
+    cluster = clusters_service.cluster_service('c-2').get()
+    assert cluster.version.minor == 2
+    assert connection.calls == []
+
+
+def test_requests_are_replayed_by_arguments(tmpdir):
+    connection, path = _record(tmpdir)
+    clusters_service = Connection(URL, Recording.load(path)) \
+        .system_service().clusters_service()
+    clusters = clusters_service.list(search='name=cluster1')
+    assert [cluster.id for cluster in clusters] == ['c-1']
+    with pytest.raises(ReplayError):
+        clusters_service.list(search='name=cluster2')
+    with pytest.raises(ReplayError):
+        Connection(URL + '/other', Recording.load(path)) \
+            .system_service().clusters_service().list()
+
+
+def test_only_reads_are_replayed(tmpdir):
+    connection, path = _record(tmpdir)
+    clusters_service = Connection(URL, Recording.load(path)) \
+        .system_service().clusters_service()
+    with pytest.raises(ReplayError):
+        clusters_service.add(types.Cluster(name='new'))
+
+
+def test_requests_are_counted(tmpdir):
+    connection, path = _record(tmpdir)
+    replay = Connection(URL, Recording.load(path))
+    clusters_service = replay.system_service().clusters_service()
+    clusters_service.list()
+    clusters_service.cluster_service('c-2').get()
+    assert replay.requests == 2
+    counted = Connection(URL, connection=connection)
+    counted.system_service().clusters_service().list()
+    assert counted.requests == 1
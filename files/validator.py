@@ -3,15 +3,24 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import io
 import os
 import sys
+import time
 import yaml
 
+from concurrent.futures import ThreadPoolExecutor
+
 import ovirtsdk4 as sdk
 import ovirtsdk4.types as types
 
 from bcolors import bcolors
 from configparser import ConfigParser
+from inventory import (get_inventory, invalidate_snapshot, load_snapshot,
+                       read_snapshot_conf, save_snapshot)
+from mapping_loader import check_schema, load_mapping_file
+from mapping_rules import RULES, check_mappings, duplicates
+from sdk_proxy import Connection, Recording
 from ansible.module_utils.six.moves import input
 
 
@@ -36,12 +45,30 @@ class ValidateMappingFile:
     aff_group_map = 'dr_affinity_group_mappings'
     aff_label_map = 'dr_affinity_label_mappings'
     network_map = 'dr_network_mappings'
-
-    def run(self, conf_file):
+    snapshot_dir = ""
+    snapshot_ttl = 0
+    refresh = False
+    recording = None
+    record = ""
+    replay = ""
+
+    def run(self, conf_file, refresh=False, record="", replay=""):
         print("%s%sValidate variable mapping file "
               "for oVirt ansible disaster recovery%s"
               % (INFO, PREFIX, END))
         self._set_dr_conf_variables(conf_file)
+        self.snapshot_dir, self.snapshot_ttl = read_snapshot_conf(conf_file)
+        self.refresh = refresh
+        self.record = record
+        self.replay = replay
+        if replay:
+            self.recording = Recording.load(replay)
+        elif record:
+            self.recording = Recording()
+        if self.recording is not None:
+            # The requests must reach the recording, not be answered out of
+            # the inventory snapshots.
+            self.snapshot_dir = ""
         print("%s%sVar File: '%s'%s" % (INFO, PREFIX, self.var_file, END))
         while not os.path.isfile(self.var_file):
             self.var_file = input(
@@ -50,12 +77,17 @@ class ValidateMappingFile:
                 (FAIL, PREFIX, self.var_file, END))
 
         python_vars = self._read_var_file()
-        self.primary_pwd = input(
-            "%s%sPlease provide password for the primary setup: %s" %
-            (INPUT, PREFIX, END))
-        self.second_pwd = input(
-            "%s%sPlease provide password for the secondary setup: %s" %
-            (INPUT, PREFIX, END))
+        if replay:
+            print("%s%sReplaying the setups out of '%s'%s"
+                  % (INFO, PREFIX, replay, END))
+            self.primary_pwd, self.second_pwd = '', ''
+        else:
+            self.primary_pwd = input(
+                "%s%sPlease provide password for the primary setup: %s" %
+                (INPUT, PREFIX, END))
+            self.second_pwd = input(
+                "%s%sPlease provide password for the secondary setup: %s" %
+                (INPUT, PREFIX, END))
 
         if (not self._validate_lists_in_mapping_file(python_vars)
                 or not self._validate_duplicate_keys(python_vars)
@@ -74,21 +106,11 @@ class ValidateMappingFile:
         self._print_finish_success()
 
     def _validate_lists_in_mapping_file(self, mapping_vars):
-        return self._is_list(mapping_vars, self.cluster_map) and self._is_list(
-            mapping_vars, self.domain_map) and self._is_list(
-            mapping_vars, self.role_map) and self._is_list(
-            mapping_vars, self.aff_group_map) and self._is_list(
-            mapping_vars, self.aff_label_map) and self._is_list(
-            mapping_vars, self.network_map)
-
-    def _is_list(self, mapping_vars, mapping):
-        map_file = mapping_vars.get(mapping)
-        if not isinstance(map_file, list) and map_file is not None:
-            print("%s%s%s is not a list: '%s'."
-                  " Please check your mapping file%s"
-                  % (FAIL, PREFIX, mapping, map_file, END))
-            return False
-        return True
+        errors = check_schema(mapping_vars)
+        for error in errors:
+            print("%s%s%s. Please check your mapping file%s"
+                  % (FAIL, PREFIX, error, END))
+        return not errors
 
     def _print_finish_error(self):
         print("%s%sFailed to validate variable mapping file "
@@ -101,9 +123,7 @@ class ValidateMappingFile:
               % (INFO, PREFIX, END))
 
     def _read_var_file(self):
-        with open(self.var_file, 'r') as info:
-            info_dict = yaml.safe_load(info)
-        return info_dict
+        return load_mapping_file(self.var_file)
 
     def _set_dr_conf_variables(self, conf_file):
         _SECTION = 'validate_vars'
@@ -130,55 +150,88 @@ class ValidateMappingFile:
 
         self.var_file = var_file
 
-    def _print_duplicate_keys(self, duplicates, keys):
-        ret_val = False
-        for key in keys:
-            if len(duplicates[key]) > 0:
-                print("%s%sFound the following duplicate keys in %s: %s%s" %
-                      (FAIL, PREFIX, key, list(duplicates[key]), END))
-                ret_val = True
-        return ret_val
-
     def _entity_validator(self, python_vars):
         ovirt_setups = ConnectSDK(
             python_vars,
             self.primary_pwd,
-            self.second_pwd)
+            self.second_pwd,
+            self.recording,
+            self.replay)
         isValid = ovirt_setups.validate_primary()
         isValid = ovirt_setups.validate_secondary() and isValid
         if isValid:
-            primary_conn, second_conn = '', ''
+            conns = []
             try:
-                primary_conn = ovirt_setups.connect_primary()
-                if primary_conn is None:
-                    return False
-                isValid = self._validate_entities_in_setup(
-                    primary_conn, 'primary', python_vars) and isValid
-                second_conn = ovirt_setups.connect_secondary()
-                if second_conn is None:
+                # The setups are validated in parallel, every setup printing
+                # to a buffer of its own, and what every setup printed is
+                # printed once both are done, one setup after the other.
+                setups = [
+                    ('primary', ovirt_setups.connect_primary,
+                     ovirt_setups.primary_url, io.StringIO()),
+                    ('secondary', ovirt_setups.connect_secondary,
+                     ovirt_setups.second_url, io.StringIO()),
+                ]
+                with ThreadPoolExecutor(max_workers=2) as pool:
+                    futures = [
+                        pool.submit(self._validate_setup, connect, url, setup,
+                                    python_vars, out)
+                        for setup, connect, url, out in setups
+                    ]
+                # Keep the connections of both setups, so they are closed
+                # even if the validation of the other setup failed.
+                conns = [future.result()[0] for future in futures
+                         if future.exception() is None]
+                for (setup, connect, url, out), future in zip(setups,
+                                                              futures):
+                    sys.stdout.write(out.getvalue())
+                    conn, valid, seconds = future.result()
+                    print("%s%sValidated the %s setup in %.2f seconds with "
+                          "%d requests%s"
+                          % (INFO, PREFIX, setup, seconds,
+                             conn.requests if conn else 0, END))
+                    isValid = valid and isValid
+                primary_conn, second_conn = [future.result()[0]
+                                             for future in futures]
+                if primary_conn is None or second_conn is None:
                     return False
-                isValid = self._validate_entities_in_setup(
-                    second_conn, 'secondary', python_vars) and isValid
                 cluster_mapping = python_vars.get(self.cluster_map)
-                isValid = isValid and self._validate_vms_for_failback(
-                    primary_conn,
-                    "primary")
-                isValid = isValid and self._validate_vms_for_failback(
-                    second_conn,
-                    "secondary")
                 isValid = isValid and self._is_compatible_versions(
                     primary_conn,
                     second_conn,
                     cluster_mapping)
             finally:
                 # Close the connections.
-                if primary_conn:
-                    primary_conn.close()
-                if second_conn:
-                    second_conn.close()
+                for conn in conns:
+                    if conn:
+                        conn.close()
+                if self.record:
+                    self.recording.save(self.record)
 
         return isValid
 
+    def _validate_setup(self, connect, url, setup, python_vars, out=None):
+        """
+        Connect to the setup and validate its entities and its VMs for
+        failback, printing to 'out'. Return the connection, which is None if
+        the connection failed, whether the setup is valid, and the seconds
+        it took.
+        """
+        start = time.time()
+        conn = connect(out)
+        if conn is None:
+            return None, False, time.time() - start
+        try:
+            isValid = self._validate_entities_in_setup(
+                conn, url, setup, python_vars, out)
+            isValid = isValid and self._validate_vms_for_failback(
+                conn,
+                setup,
+                out)
+        except Exception:
+            conn.close()
+            raise
+        return conn, isValid, time.time() - start
+
     def _validate_failback_leftovers(self):
         valid = {"yes": True, "y": True, "ye": True,
                  "no": False, "n": False}
@@ -215,89 +268,52 @@ class ValidateMappingFile:
                 return False
         return True
 
-    def _validate_entities_in_setup(self, conn, setup, python_vars):
-        dcs_service = conn.system_service().data_centers_service()
-        dcs_list = dcs_service.list()
-        clusters = []
-        affinity_groups = set()
-        for dc in dcs_list:
-            dc_service = dcs_service.data_center_service(dc.id)
-            clusters_service = dc_service.clusters_service()
-            attached_clusters_list = clusters_service.list()
-            for cluster in attached_clusters_list:
-                clusters.append(cluster.name)
-                cluster_service = clusters_service.cluster_service(cluster.id)
-                affinity_groups.update(
-                    self._fetch_affinity_groups(cluster_service))
-        aff_labels = self._get_affinity_labels(conn)
-        aaa_domains = self._get_aaa_domains(conn)
+    def _validate_entities_in_setup(self, conn, url, setup, python_vars,
+                                    out=None):
+        inventory = self._get_inventory(conn, url, out)
         # TODO: Remove once vnic profile is validated.
-        networks = self._get_vnic_profile_mapping(conn)
         isValid = self._validate_networks(
             python_vars,
-            networks,
-            setup)
+            inventory['vnic_profiles'],
+            setup,
+            out)
         isValid = self._validate_entity_exists(
-            clusters,
+            inventory['clusters'],
             python_vars,
             self.cluster_map,
-            setup) and isValid
+            setup,
+            out) and isValid
         isValid = self._validate_entity_exists(
-            list(affinity_groups),
+            list(set(inventory['affinity_groups'])),
             python_vars,
             self.aff_group_map,
-            setup) and isValid
+            setup,
+            out) and isValid
         isValid = self._validate_entity_exists(
-            aff_labels,
+            list(set(inventory['affinity_labels'])),
             python_vars,
             self.aff_label_map,
-            setup) and isValid
+            setup,
+            out) and isValid
         return isValid
 
-    def _fetch_affinity_groups(self, cluster_service):
-        affinity_groups = set()
-        affinity_groups_service = cluster_service.affinity_groups_service()
-        for affinity_group in affinity_groups_service.list():
-            affinity_groups.add(affinity_group.name)
-        return list(affinity_groups)
-
-    def _get_affinity_labels(self, conn):
-        affinity_labels = set()
-        affinity_labels_service = \
-            conn.system_service().affinity_labels_service()
-        for affinity_label in affinity_labels_service.list():
-            affinity_labels.add(affinity_label.name)
-        return list(affinity_labels)
-
-    def _get_aaa_domains(self, conn):
-        domains = []
-        domains_service = conn.system_service().domains_service()
-        domains_list = domains_service.list()
-        for domain in domains_list:
-            domains.append(domain.name)
-        return domains
-
-    def _get_vnic_profile_mapping(self, conn):
-        networks = []
-        vnic_profiles_service = conn.system_service().vnic_profiles_service()
-        vnic_profile_list = vnic_profiles_service.list()
-        for vnic_profile_item in vnic_profile_list:
-            mapped_network = {}
-            networks_list = conn.system_service().networks_service().list()
-            network_name = ''
-            for network_item in networks_list:
-                if network_item.id == vnic_profile_item.network.id:
-                    network_name = network_item.name
-                    dc_name = conn.system_service().data_centers_service(). \
-                        data_center_service(network_item.data_center.id). \
-                        get()._name
-                    break
-            mapped_network['network_name'] = network_name
-            # TODO: 'dc_name' might be referenced before assignment.
-            mapped_network['network_dc'] = dc_name
-            mapped_network['profile_name'] = vnic_profile_item.name
-            networks.append(mapped_network)
-        return networks
+    def _get_inventory(self, conn, url, out=None):
+        """
+        Return the inventory of the setup out of its snapshot while it is
+        fresh, so repeated validations do not walk the setup again.
+        """
+        if self.refresh:
+            invalidate_snapshot(self.snapshot_dir, url)
+        else:
+            inventory = load_snapshot(self.snapshot_dir, url,
+                                      self.snapshot_ttl)
+            if inventory is not None:
+                print("%s%sUsing the inventory snapshot of '%s'%s"
+                      % (INFO, PREFIX, url, END), file=out)
+                return inventory
+        inventory = get_inventory(conn)
+        save_snapshot(self.snapshot_dir, url, inventory)
+        return inventory
 
     def _key_setup(self, setup, key):
         if setup == 'primary':
@@ -317,7 +333,8 @@ class ValidateMappingFile:
                         'secondary_network_dc']
             return 'secondary_name'
 
-    def _validate_networks(self, var_file, networks_setup, setup):
+    def _validate_networks(self, var_file, networks_setup, setup,
+                           out=None):
         dups = self._get_network_dups(networks_setup)
         _mappings = var_file.get(self.network_map)
         keys = self._key_setup(setup, self.network_map)
@@ -337,12 +354,12 @@ class ValidateMappingFile:
                          mapping[keys[0]],
                          mapping[keys[1]],
                          setup,
-                         END))
+                         END), file=out)
                     return False
                 # TODO: Add check whether the data center exists in the setup
         print("%s%sFinished validation for 'dr_network_mappings' for "
               "%s setup with success.%s" %
-              (INFO, PREFIX, setup, END))
+              (INFO, PREFIX, setup, END), file=out)
         return True
 
     def _get_network_dups(self, networks_setup):
@@ -351,10 +368,10 @@ class ValidateMappingFile:
                       + attr['network_name']
                       + "_"
                       + attr['network_dc'] for attr in networks_setup]
-        dups = [x for n, x in enumerate(attributes) if x in attributes[:n]]
-        return dups
+        return duplicates(attributes)
 
-    def _validate_entity_exists(self, _list, var_file, key, setup):
+    def _validate_entity_exists(self, _list, var_file, key, setup,
+                                out=None):
         isValid = True
         key_setup = self._key_setup(setup, key)
         _mapping = var_file.get(key)
@@ -369,7 +386,7 @@ class ValidateMappingFile:
                      key_setup,
                      key,
                      x.keys(),
-                     END))
+                     END), file=out)
                 isValid = False
             if isValid and x[key_setup] not in _list:
                 print(
@@ -383,13 +400,13 @@ class ValidateMappingFile:
                      x[key_setup],
                      PREFIX,
                      _list,
-                     END))
+                     END), file=out)
                 isValid = False
         if isValid:
             print(
                 "%s%sFinished validation for '%s' for key name "
                 "'%s' with success.%s" %
-                (INFO, PREFIX, key, key_setup, END))
+                (INFO, PREFIX, key, key_setup, END), file=out)
         return isValid
 
     def _validate_hosted_engine(self, var_file):
@@ -415,52 +432,46 @@ class ValidateMappingFile:
         return True
 
     def _validate_duplicate_keys(self, var_file):
-        clusters = 'clusters'
-        domains = 'domains'
-        roles = 'roles'
-        aff_groups = 'aff_groups'
-        aff_labels = 'aff_labels'
-        network = 'network'
-        key1 = 'primary_name'
-        key2 = 'secondary_name'
-        dr_primary_name = 'dr_primary_name'
-        dr_secondary_name = 'dr_secondary_name'
-
-        duplicates = self._get_dups(
-            var_file, [
-                [clusters, self.cluster_map, key1, key2],
-                [domains, self.domain_map, dr_primary_name, dr_secondary_name],
-                [roles, self.role_map, key1, key2],
-                [aff_groups, self.aff_group_map, key1, key2],
-                [aff_labels, self.aff_label_map, key1, key2]])
-        duplicates[network] = self._get_dup_network(var_file)
-        return not self._print_duplicate_keys(
-            duplicates,
-            [clusters, domains, roles, aff_groups, aff_labels, network])
-
-    def _validate_vms_for_failback(self, setup_conn, setup_type):
+        for rule in RULES:
+            if not var_file.get(rule.section):
+                print("%s%smapping %s is empty in var file%s"
+                      % (WARN, PREFIX, rule.section, END))
+        violations = check_mappings(var_file)
+        for violation in violations:
+            print("%s%s%s[%d]: %s%s" % (FAIL,
+                                        PREFIX,
+                                        violation.section,
+                                        violation.index,
+                                        violation.message,
+                                        END))
+        return not violations
+
+    def _validate_vms_for_failback(self, setup_conn, setup_type,
+                                   out=None):
         vms_in_preview = []
         vms_delete_protected = []
         service_setup = setup_conn.system_service().vms_service()
-        for vm in service_setup.list():
-            vm_service = service_setup.vm_service(vm.id)
+        # The snapshots are followed from the VMs, so a single request is
+        # sent whatever the number of VMs.
+        for vm in service_setup.list(follow='snapshots'):
             if vm.delete_protected:
                 vms_delete_protected.append(vm.name)
-            snapshots_service = vm_service.snapshots_service()
-            for snapshot in snapshots_service.list():
+            for snapshot in vm.snapshots or []:
                 if snapshot.snapshot_status == types.SnapshotStatus.IN_PREVIEW:
                     vms_in_preview.append(vm.name)
         if len(vms_in_preview) > 0:
             print("%s%sFailback process does not support VMs in preview."
                   " The '%s' setup contains the following previewed vms:"
                   " '%s'%s"
-                  % (FAIL, PREFIX, setup_type, vms_in_preview, END))
+                  % (FAIL, PREFIX, setup_type, vms_in_preview, END),
+                  file=out)
             return False
         if len(vms_delete_protected) > 0:
             print("%s%sFailback process does not support delete protected"
                   " VMs. The '%s' setup contains the following vms:"
                   " '%s'%s"
-                  % (FAIL, PREFIX, setup_type, vms_delete_protected, END))
+                  % (FAIL, PREFIX, setup_type, vms_delete_protected, END),
+                  file=out)
             return False
         return True
 
@@ -469,15 +480,26 @@ class ValidateMappingFile:
                                 second_conn,
                                 cluster_mapping):
         """ Validate cluster versions """
-        service_primary = primary_conn.system_service().clusters_service()
-        service_sec = second_conn.system_service().clusters_service()
-        for cluster_map in cluster_mapping:
-            search_prime = "name=%s" % cluster_map['primary_name']
-            search_sec = "name=%s" % cluster_map['secondary_name']
-            cluster_prime = service_primary.list(search=search_prime)[0]
-            cluster_sec = service_sec.list(search=search_sec)[0]
-            prime_ver = cluster_prime.version
-            sec_ver = cluster_sec.version
+        # The clusters of every setup are listed once and indexed by name,
+        # whatever the number of mappings.
+        prime_versions = self._get_cluster_versions(primary_conn)
+        sec_versions = self._get_cluster_versions(second_conn)
+        isValid = True
+        for cluster_map in cluster_mapping or []:
+            prime_name = cluster_map['primary_name']
+            sec_name = cluster_map['secondary_name']
+            prime_ver = prime_versions.get(prime_name)
+            sec_ver = sec_versions.get(sec_name)
+            if prime_ver is None:
+                print("%s%sCluster '%s' does not exist in the primary "
+                      "setup%s" % (FAIL, PREFIX, prime_name, END))
+                isValid = False
+            if sec_ver is None:
+                print("%s%sCluster '%s' does not exist in the secondary "
+                      "setup%s" % (FAIL, PREFIX, sec_name, END))
+                isValid = False
+            if prime_ver is None or sec_ver is None:
+                continue
             if (prime_ver.major != sec_ver.major
                     or prime_ver.minor != sec_ver.minor):
                 print("%s%sClusters have incompatible versions. "
@@ -485,102 +507,20 @@ class ValidateMappingFile:
                       "secondary setup ('%s' %s.%s)%s"
                       % (FAIL,
                          PREFIX,
-                         cluster_prime.name,
+                         prime_name,
                          prime_ver.major,
                          prime_ver.minor,
-                         cluster_sec.name,
+                         sec_name,
                          sec_ver.major,
                          sec_ver.minor,
                          END))
-                return False
-        return True
-
-    def _get_dups(self, var_file, mappings):
-        duplicates = {}
-        for mapping in mappings:
-            _return_set = set()
-            _mapping = var_file.get(mapping[1])
-            if _mapping is None or len(_mapping) < 1:
-                print("%s%smapping %s is empty in var file%s"
-                      % (WARN, PREFIX, mapping[1], END))
-                duplicates[mapping[0]] = _return_set
-                continue
-            _primary = set()
-            _second = set()
-            _return_set.update(
-                set(x[mapping[2]]
-                    for x in _mapping
-                    if x[mapping[2]]
-                    in _primary or _primary.add(x[mapping[2]])))
-            _return_set.update(
-                set(x[mapping[3]]
-                    for x in _mapping
-                    if x[mapping[3]]
-                    in _second or _second.add(x[mapping[3]])))
-            duplicates[mapping[0]] = _return_set
-        return duplicates
-
-    def _get_dup_network(self, var_file):
-        _return_set = set()
-        # TODO: Add data center also
-        _mapping = var_file.get(self.network_map)
-        if _mapping is None or len(_mapping) < 1:
-            print("%s%sNetwork has not been initialized in var file%s"
-                  % (WARN, PREFIX, END))
-            return _return_set
-
-        # Check for profile + network name duplicates in primary
-        _primary1 = set()
-        key1_a = 'primary_profile_name'
-        key1_b = 'primary_network_name'
-        key1_c = 'primary_network_dc'
-        for x in _mapping:
-            if x[key1_a] is None or x[key1_b] is None:
-                print("%s%sNetwork '%s' is not initialized in map %s %s%s"
-                      % (FAIL,
-                         PREFIX,
-                         x,
-                         x[key1_a],
-                         x[key1_b],
-                         END))
-                sys.exit()
-            primary_dc_name = ''
-            if key1_c in x:
-                primary_dc_name = x[key1_c]
-            map_key = x[key1_a] + "_" + x[key1_b] + "_" + primary_dc_name
-            if map_key in _primary1:
-                _return_set.add(map_key)
-            else:
-                _primary1.add(map_key)
-
-        # Check for profile + network name duplicates in secondary
-        _second1 = set()
-        val1_a = 'secondary_profile_name'
-        val1_b = 'secondary_network_name'
-        val1_c = 'secondary_network_dc'
-        for x in _mapping:
-            if x[val1_a] is None or x[val1_b] is None:
-                print("%s%sThe following network mapping is not "
-                      "initialized in var file mapping:\n"
-                      "  %s:'%s'\n  %s:'%s'%s"
-                      % (FAIL,
-                         PREFIX,
-                         val1_a,
-                         x[val1_a],
-                         val1_b,
-                         x[val1_b],
-                         END))
-                sys.exit()
-            secondary_dc_name = ''
-            if val1_c in x:
-                secondary_dc_name = x[val1_c]
-            map_key = x[val1_a] + "_" + x[val1_b] + "_" + secondary_dc_name
-            if map_key in _second1:
-                _return_set.add(map_key)
-            else:
-                _second1.add(map_key)
+                isValid = False
+        return isValid
 
-        return _return_set
+    def _get_cluster_versions(self, conn):
+        clusters_service = conn.system_service().clusters_service()
+        return dict((cluster.name, cluster.version)
+                    for cluster in clusters_service.list())
 
 
 class DefaultOption(dict):
@@ -608,7 +548,8 @@ class ConnectSDK:
     error_msg = "%s%s The '%s' field in the %s setup is not " \
                 "initialized in var file mapping.%s"
 
-    def __init__(self, var_file, primary_pwd, second_pwd):
+    def __init__(self, var_file, primary_pwd, second_pwd, recording=None,
+                 replay=""):
         """
         ---
         dr_sites_primary_url: http://xxx.xx.xx.xxx:8080/ovirt-engine/api
@@ -628,6 +569,8 @@ class ConnectSDK:
         self.second_ca = var_file.get('dr_sites_secondary_ca_file')
         self.primary_pwd = primary_pwd
         self.second_pwd = second_pwd
+        self.recording = recording
+        self.replay = replay
 
     def validate_primary(self):
         isValid = True
@@ -685,12 +628,13 @@ class ConnectSDK:
             isValid = False
         return isValid
 
-    def _validate_connection(self, url, username, password, ca):
+    def _validate_connection(self, url, username, password, ca,
+                             out=None):
         conn = None
         try:
             conn = self._connect_sdk(url, username, password, ca)
-            dcs_service = conn.system_service().data_centers_service()
-            dcs_service.list()
+            # Only check the credentials, the inventory is fetched later.
+            conn.test(raise_exception=True)
         except Exception:
             print(
                 "%s%sConnection to setup has failed."
@@ -706,32 +650,41 @@ class ConnectSDK:
                  username,
                  PREFIX,
                  ca,
-                 END))
+                 END), file=out)
             if conn:
                 conn.close()
             return None
         return conn
 
-    def connect_primary(self):
+    def connect_primary(self, out=None):
         return self._validate_connection(self.primary_url,
                                          self.primary_user,
                                          self.primary_pwd,
-                                         self.primary_ca)
+                                         self.primary_ca,
+                                         out)
 
-    def connect_secondary(self):
+    def connect_secondary(self, out=None):
         return self._validate_connection(self.second_url,
                                          self.second_user,
                                          self.second_pwd,
-                                         self.second_ca)
+                                         self.second_ca,
+                                         out)
 
     def _connect_sdk(self, url, username, password, ca):
-        connection = sdk.Connection(
+        """
+        Return a connection to the setup, which counts the requests it
+        sends and records their responses if a recording is set, or a
+        connection which replays them, without the setup, if 'replay' is
+        set.
+        """
+        if self.replay:
+            return Connection(url, self.recording)
+        return Connection(url, self.recording, sdk.Connection(
             url=url,
             username=username,
             password=password,
             ca_file=ca,
-        )
-        return connection
+        ))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,200 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import sys
+import threading
+
+import pytest
+
+import ovirtsdk4.types as types
+
+import validator
+
+PYTHON_VARS = {
+    'dr_sites_primary_url': 'https://primary/ovirt-engine/api',
+    'dr_sites_primary_username': 'admin@internal',
+    'dr_sites_primary_ca_file': 'primary.pem',
+    'dr_sites_secondary_url': 'https://secondary/ovirt-engine/api',
+    'dr_sites_secondary_username': 'admin@internal',
+    'dr_sites_secondary_ca_file': 'secondary.pem',
+    'dr_cluster_mappings': [],
+}
+
+
+class FakeConnection:
+
+    def __init__(self, url):
+        self.url = url
+        self.closed = False
+        self.requests = 0
+
+    def close(self):
+        self.closed = True
+
+
+def _validator(monkeypatch, valid):
+    """
+    Return a validator whose setups only pass the entity validation once
+    both are being validated, and the connections it opened. A setup whose
+    validity is an exception raises it.
+    """
+    both_setups = threading.Barrier(2, timeout=5)
+    conns = []
+    stdout = sys.stdout
+
+    def _validate_connection(self, url, username, password, ca, out=None):
+        conn = FakeConnection(url)
+        conns.append(conn)
+        return conn
+
+    def _validate_entities_in_setup(self, conn, url, setup, python_vars,
+                                    out=None):
+        assert sys.stdout is stdout
+        print("checking %s" % setup, file=out)
+        both_setups.wait()
+        print("checked %s" % setup, file=out)
+        conn.requests += len(setup)
+        if isinstance(valid[setup], Exception):
+            raise valid[setup]
+        return valid[setup]
+
+    monkeypatch.setattr(validator.ConnectSDK, '_validate_connection',
+                        _validate_connection)
+    monkeypatch.setattr(validator.ValidateMappingFile,
+                        '_validate_entities_in_setup',
+                        _validate_entities_in_setup)
+    monkeypatch.setattr(validator.ValidateMappingFile,
+                        '_validate_vms_for_failback',
+                        lambda self, conn, setup, out=None: True)
+    monkeypatch.setattr(validator.ValidateMappingFile,
+                        '_is_compatible_versions',
+                        lambda self, primary, second, mapping: True)
+    validate = validator.ValidateMappingFile()
+    validate.primary_pwd, validate.second_pwd = 'primary', 'secondary'
+    return validate, conns
+
+
+def test_setups_are_validated_in_parallel(monkeypatch, capsys):
+    validate, conns = _validator(monkeypatch,
+                                 {'primary': True, 'secondary': True})
+
+    assert validate._entity_validator(PYTHON_VARS)
+
+    lines = [line for line in capsys.readouterr().out.splitlines()
+             if line.startswith('check')]
+    assert lines == ['checking primary', 'checked primary',
+                     'checking secondary', 'checked secondary']
+    assert all(conn.closed for conn in conns)
+
+
+def test_invalid_setup_fails_validation(monkeypatch, capsys):
+    validate, conns = _validator(monkeypatch,
+                                 {'primary': True, 'secondary': False})
+
+    assert not validate._entity_validator(PYTHON_VARS)
+
+    out = capsys.readouterr().out
+    assert 'Validated the primary setup in' in out
+    assert 'seconds with 7 requests' in out
+    assert 'Validated the secondary setup in' in out
+    assert 'seconds with 9 requests' in out
+    assert all(conn.closed for conn in conns)
+
+
+def test_connections_are_closed_if_a_setup_fails(monkeypatch, capsys):
+    validate, conns = _validator(
+        monkeypatch, {'primary': Exception('boom'), 'secondary': True})
+
+    with pytest.raises(Exception, match='boom'):
+        validate._entity_validator(PYTHON_VARS)
+
+    assert len(conns) == 2
+    assert all(conn.closed for conn in conns)
+
+
+class FakeVmsService:
+
+    def __init__(self, vms):
+        self.vms = vms
+        self.calls = 0
+
+    def list(self, **kwargs):
+        self.calls += 1
+        return self.vms
+
+    def system_service(self):
+        return self
+
+    def vms_service(self):
+        return self
+
+
+def _vm(name, delete_protected=False, status=types.SnapshotStatus.OK):
+    return types.Vm(name=name, delete_protected=delete_protected,
+                    snapshots=[types.Snapshot(snapshot_status=status)])
+
+
+def test_vms_for_failback_are_checked_with_one_request():
+    conn = FakeVmsService([_vm('vm%d' % i) for i in range(1000)])
+    assert validator.ValidateMappingFile()._validate_vms_for_failback(
+        conn, 'primary')
+    assert conn.calls == 1
+
+
+def test_vms_in_preview_or_delete_protected_fail(capsys):
+    validate = validator.ValidateMappingFile()
+    conn = FakeVmsService([
+        _vm('ok'), _vm('previewed', status=types.SnapshotStatus.IN_PREVIEW)])
+    assert not validate._validate_vms_for_failback(conn, 'primary')
+    assert "['previewed']" in capsys.readouterr().out
+    conn = FakeVmsService([_vm('ok'), _vm('protected', True)])
+    assert not validate._validate_vms_for_failback(conn, 'primary')
+    assert "['protected']" in capsys.readouterr().out
+
+
+class FakeClustersService:
+
+    def __init__(self, versions):
+        self.clusters = [
+            types.Cluster(name=name,
+                          version=types.Version(major=major, minor=minor))
+            for name, (major, minor) in versions.items()
+        ]
+        self.calls = 0
+
+    def list(self, **kwargs):
+        self.calls += 1
+        return self.clusters
+
+    def system_service(self):
+        return self
+
+    def clusters_service(self):
+        return self
+
+
+def test_cluster_versions_are_checked_with_one_request_per_setup():
+    primary = FakeClustersService(dict(('c%d' % i, (4, 3))
+                                       for i in range(300)))
+    second = FakeClustersService(dict(('s%d' % i, (4, 3))
+                                      for i in range(300)))
+    mappings = [{'primary_name': 'c%d' % i, 'secondary_name': 's%d' % i}
+                for i in range(300)]
+    assert validator.ValidateMappingFile()._is_compatible_versions(
+        primary, second, mappings)
+    assert primary.calls == second.calls == 1
+
+
+def test_all_cluster_mismatches_are_reported(capsys):
+    primary = FakeClustersService({'a': (4, 2), 'b': (4, 3), 'c': (4, 3)})
+    second = FakeClustersService({'a': (4, 3), 'b': (4, 2)})
+    mappings = [{'primary_name': name, 'secondary_name': name}
+                for name in ('a', 'b', 'c')]
+    assert not validator.ValidateMappingFile()._is_compatible_versions(
+        primary, second, mappings)
+    out = capsys.readouterr().out
+    assert "('a' 4.2)" in out
+    assert "('b' 4.3)" in out
+    assert "Cluster 'c' does not exist in the secondary setup" in out
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+EMPTY_ELEMENT = 'EMPTY_ELEMENT'
+EMPTY_ID = '00000000-0000-0000-0000-000000000000'
+
+# The maps which are passed to the registration of templates and VMs,
+# with the mappings of the var file they are built of.
+NAME_MAPS = [
+    ('dr_cluster_map', 'dr_cluster_mappings'),
+    ('dr_affinity_group_map', 'dr_affinity_group_mappings'),
+    ('dr_affinity_label_map', 'dr_affinity_label_mappings'),
+    ('dr_domain_map', 'dr_domain_mappings'),
+    ('dr_role_map', 'dr_role_mappings'),
+]
+
+
+def _value(item, key, default=EMPTY_ELEMENT):
+    # Same as "item[key] | default(default, true)".
+    return item.get(key) or default
+
+
+def _name_map(mappings, source, target):
+    return [
+        {
+            'source_name': _value(item, source + '_name'),
+            'dest_name': _value(item, target + '_name'),
+        } for item in mappings or []
+    ]
+
+
+def _network_map(mappings, source, target):
+    return [
+        {
+            'source_network_name': _value(item, source + '_network_name'),
+            'source_profile_name': _value(item, source + '_profile_name'),
+            'target_network_dc': _value(item, target + '_network_dc'),
+            'target_profile_id': _value(item, target + '_profile_id',
+                                        EMPTY_ID),
+        } for item in mappings or []
+    ]
+
+
+def _lun_map(mappings, source, target):
+    return [
+        {
+            'source_logical_unit_id':
+                _value(item, source + '_logical_unit_id'),
+            'source_storage_type': _value(item, source + '_storage_type'),
+            'dest_logical_unit_id': _value(item, target + '_logical_unit_id'),
+            'dest_storage_type': _value(item, target + '_storage_type'),
+            'dest_logical_unit_address':
+                _value(item, target + '_logical_unit_address'),
+            'dest_logical_unit_port':
+                _value(item, target + '_logical_unit_port', 3260),
+            'dest_logical_unit_portal':
+                _value(item, target + '_logical_unit_portal', '1'),
+            'dest_logical_unit_username':
+                _value(item, target + '_logical_unit_username', ''),
+            'dest_logical_unit_password':
+                _value(item, target + '_logical_unit_password', ''),
+            'dest_logical_unit_target':
+                _value(item, target + '_logical_unit_target', '[]'),
+        } for item in mappings or []
+    ]
+
+
+def dr_build_maps(mappings, source, target):
+    """
+    Build all the maps of the registration out of the mappings of the var
+    file in one pass, e.g.:
+    "{{ {'dr_cluster_mappings': dr_cluster_mappings, ...}
+        | dr_build_maps(dr_source_map, dr_target_host) }}"
+    """
+    maps = dict(
+        (name, _name_map(mappings.get(key), source, target))
+        for name, key in NAME_MAPS
+    )
+    maps['dr_network_map'] = _network_map(
+        mappings.get('dr_network_mappings'), source, target)
+    maps['dr_lun_map'] = _lun_map(
+        mappings.get('dr_lun_mappings'), source, target)
+    return maps
+
+
+class FilterModule(object):
+
+    def filters(self):
+        return {
+            'dr_build_maps': dr_build_maps,
+        }
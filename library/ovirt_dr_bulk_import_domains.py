@@ -0,0 +1,325 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: ovirt_dr_bulk_import_domains
+short_description: Add or import storage domains in bulk
+description:
+    - Add the file storage domains and import the block storage domains of
+      the mapping var file to the target setup, attach them to their data
+      center and wait until they are active, running up to
+      C(concurrency) domains at the same time.
+    - A domain which already exists in the setup is only attached and
+      activated, so the module may run again after a partial failure.
+    - The up hosts of every data center are listed once, and the domains
+      are mounted, and their iSCSI targets logged in to, by these hosts in
+      turn.
+    - A failed domain does not stop the others, the outcome of every
+      domain is returned with the seconds it took.
+options:
+    storages:
+        description:
+            - Storage domains to add, as C(dr_import_storages) entries of
+              the mapping var file.
+        type: list
+        required: true
+    target_host:
+        description:
+            - Site the domains are added to, the C(dr_target_host) of the
+              play.
+        required: true
+    concurrency:
+        description:
+            - Maximum number of domains added to the engine in parallel.
+        type: int
+        default: 5
+    timeout:
+        description:
+            - Seconds to wait for a domain to be active in its data center.
+        type: int
+        default: 180
+    poll_interval:
+        description:
+            - Seconds between the status checks of a domain.
+        type: int
+        default: 3
+    max_logins_in_flight:
+        description:
+            - Maximum number of iSCSI target logins of a domain sent to the
+              engine in parallel. The domain is imported once all its
+              targets were logged in to.
+        type: int
+        default: 4
+extends_documentation_fragment: ovirt
+'''
+
+EXAMPLES = '''
+- name: Add non master storage domains
+  ovirt_dr_bulk_import_domains:
+      storages: "{{ dr_import_storages
+                    | rejectattr('dr_secondary_master_domain') | list }}"
+      target_host: secondary
+      concurrency: 10
+      auth: "{{ ovirt_auth }}"
+'''
+
+RETURN = '''
+succeeded:
+    description:
+        - Domains which were added, with the seconds it took and the host
+          which mounted them. C(login_seconds) is the time the iSCSI
+          logins of an iSCSI domain took, and C(import_seconds) the time
+          its import and attach took.
+    returned: always
+    type: list
+    sample: [{"name": "data1", "seconds": 41.2, "host": "host1",
+              "login_seconds": 2.3, "import_seconds": 38.9}]
+failed:
+    description: Domains which failed to be added, with the error.
+    returned: always
+    type: list
+    sample: [{"name": "data2", "seconds": 3.4, "msg": "No hosts available"}]
+seconds:
+    description: The seconds it took to add all the domains.
+    returned: always
+    type: float
+'''
+
+import time
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.ovirt import check_sdk, ovirt_full_argument_spec
+from ansible.module_utils.ovirt_dr import (
+    DependencyScheduler,
+    HostCache,
+    RequestWindow,
+)
+from ansible.module_utils.parsing.convert_bool import boolean
+
+try:
+    import ovirtsdk4 as sdk
+    import ovirtsdk4.types as otypes
+except ImportError:
+    pass
+
+# Block domains keep their ID and are imported, file domains are added
+# out of their path.
+BLOCK_TYPES = ('iscsi', 'fcp')
+
+
+def _bool(value):
+    return None if value is None else boolean(value)
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _iscsi_login(system_service, host, storage, prefix, limit):
+    """
+    Log the host in to all the targets of the domain, keeping up to
+    'limit' logins in flight, and fail with every target which could not
+    be logged in to.
+    """
+    host_service = system_service.hosts_service().host_service(host.id)
+    window = RequestWindow(limit)
+    errors = []
+
+    def _collect():
+        target, value, error, seconds = window.wait_next()
+        if error is not None:
+            errors.append('%s: %s' % (target, error))
+
+    for target in storage[prefix + 'target']:
+        if window.full():
+            _collect()
+        window.submit(target, lambda target=target: host_service.iscsi_login(
+            iscsi=otypes.IscsiDetails(
+                address=storage[prefix + 'address'],
+                port=int(storage.get(prefix + 'port') or 3260),
+                target=target,
+                username=storage.get(prefix + 'username') or None,
+                password=storage.get(prefix + 'password') or None,
+            ),
+            wait=False,
+        ))
+    while window:
+        _collect()
+    if errors:
+        raise Exception("Failed to log in to the iSCSI targets of host "
+                        "'%s': %s" % (host.name, '; '.join(errors)))
+
+
+def _host_storage(storage, prefix):
+    domain_type = storage['dr_domain_type']
+    if domain_type == 'iscsi':
+        # As ovirt_storage_domain does, the import connects to the first
+        # target of the domain, although all of them were logged in to.
+        return otypes.HostStorage(
+            type=otypes.StorageType(domain_type),
+            address=storage[prefix + 'address'],
+            logical_units=[
+                otypes.LogicalUnit(
+                    address=storage[prefix + 'address'],
+                    port=int(storage.get(prefix + 'port') or 3260),
+                    target=storage[prefix + 'target'][0],
+                    username=storage.get(prefix + 'username') or None,
+                    password=storage.get(prefix + 'password') or None,
+                ),
+            ],
+        )
+    if domain_type in BLOCK_TYPES:
+        return otypes.HostStorage(type=otypes.StorageType(domain_type))
+    return otypes.HostStorage(
+        type=otypes.StorageType(domain_type),
+        address=storage[prefix + 'address'],
+        path=storage[prefix + 'path'],
+        vfs_type=storage.get(prefix + 'vfs_type'),
+    )
+
+
+def _storage_domain(storage, prefix, host):
+    block = storage['dr_domain_type'] in BLOCK_TYPES
+    return otypes.StorageDomain(
+        id=storage['dr_domain_id'] if block else None,
+        import_=True if block else None,
+        name=storage.get(prefix + 'name') or None,
+        type=otypes.StorageDomainType(
+            storage.get('dr_storage_domain_type') or 'data'),
+        host=otypes.Host(name=host.name),
+        storage=_host_storage(storage, prefix),
+        critical_space_action_blocker=_int(
+            storage.get('dr_critical_space_action_blocker')),
+        warning_low_space_indicator=_int(
+            storage.get('dr_warning_low_space')),
+        wipe_after_delete=_bool(storage.get('dr_wipe_after_delete')),
+        discard_after_delete=_bool(storage.get('dr_discard_after_delete'))
+        if block else None,
+        backup=_bool(storage.get('dr_backup')),
+    )
+
+
+def _find_domain(sds_service, storage, prefix):
+    if storage['dr_domain_type'] in BLOCK_TYPES:
+        try:
+            return sds_service.storage_domain_service(
+                storage['dr_domain_id']).get()
+        except sdk.NotFoundError:
+            return None
+    sds = sds_service.list(search='name=%s' % storage[prefix + 'name'])
+    return sds[0] if sds else None
+
+
+def _wait_for_active(attached_service, timeout, poll_interval):
+    deadline = time.time() + timeout
+    while True:
+        status = attached_service.get().status
+        if status == otypes.StorageDomainStatus.ACTIVE:
+            return
+        if status == otypes.StorageDomainStatus.MAINTENANCE:
+            attached_service.activate()
+        if time.time() >= deadline:
+            raise Exception("The storage domain is %s after %d seconds"
+                            % (status, timeout))
+        time.sleep(poll_interval)
+
+
+def _add_domain(storage, prefix, params, hosts):
+    """
+    Return the task which adds the storage domain, or finds it, and
+    attaches it to its data center on the connection of a worker thread.
+    The domain is mounted by the next up host of its data center.
+
+    The task returns the name of the host, and the seconds the iSCSI
+    logins and the import took.
+    """
+    def run(connection):
+        outcome = {}
+        system_service = connection.system_service()
+        dc_name = storage[prefix + 'dc_name']
+        dcs_service = system_service.data_centers_service()
+        dcs = dcs_service.list(search='name=%s' % dc_name)
+        if not dcs:
+            raise Exception("Data center '%s' was not found" % dc_name)
+        host = hosts.pick(connection, dc_name)
+        outcome['host'] = host.name
+        if storage['dr_domain_type'] == 'iscsi':
+            started = time.time()
+            try:
+                _iscsi_login(system_service, host, storage, prefix,
+                             params['max_logins_in_flight'])
+            finally:
+                outcome['login_seconds'] = round(time.time() - started, 3)
+
+        started = time.time()
+        sds_service = system_service.storage_domains_service()
+        sd = _find_domain(sds_service, storage, prefix)
+        if sd is None:
+            sd = sds_service.add(_storage_domain(storage, prefix, host))
+
+        attached_sds_service = dcs_service.data_center_service(
+            dcs[0].id).storage_domains_service()
+        if sd.id not in [attached.id
+                         for attached in attached_sds_service.list()]:
+            attached_sds_service.add(otypes.StorageDomain(id=sd.id))
+        _wait_for_active(attached_sds_service.storage_domain_service(sd.id),
+                         params['timeout'], params['poll_interval'])
+        outcome['import_seconds'] = round(time.time() - started, 3)
+        return outcome
+    return run
+
+
+def main():
+    argument_spec = ovirt_full_argument_spec(
+        storages=dict(type='list', required=True),
+        target_host=dict(required=True),
+        concurrency=dict(type='int', default=5),
+        timeout=dict(type='int', default=180),
+        poll_interval=dict(type='int', default=3),
+        max_logins_in_flight=dict(type='int', default=4),
+    )
+    module = AnsibleModule(argument_spec=argument_spec)
+    check_sdk(module)
+
+    auth = module.params.pop('auth')
+    params = module.params
+    prefix = 'dr_%s_' % params['target_host']
+    result = dict(succeeded=[], failed=[])
+    try:
+        scheduler = DependencyScheduler(auth, params['concurrency'],
+                                        params['max_logins_in_flight'])
+        hosts = HostCache()
+        for index, storage in enumerate(params['storages']):
+            scheduler.add(index,
+                          _add_domain(storage, prefix, params, hosts))
+
+        started = time.time()
+        outcomes = scheduler.run()
+        result['seconds'] = round(time.time() - started, 3)
+        for index, storage in enumerate(params['storages']):
+            value, error, begin, end = outcomes[index]
+            outcome = {'name': storage.get(prefix + 'name') or '',
+                       'seconds': round(end - begin, 3)}
+            if error is None:
+                outcome.update(value)
+                result['succeeded'].append(outcome)
+            else:
+                outcome['msg'] = str(error)
+                result['failed'].append(outcome)
+        module.exit_json(changed=bool(result['succeeded']), **result)
+    except Exception as e:
+        module.fail_json(msg=str(e), exception=traceback.format_exc(),
+                         **result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: ovirt_dr_bulk_register
+short_description: Register unregistered templates and VMs in bulk
+description:
+    - Register all the unregistered templates and VMs of the given storage
+      domains, running up to C(concurrency) registrations at the same time.
+    - The template to VM dependency graph is built from the unregistered
+      OVF data, so a VM is registered as soon as its own template was
+      registered, and VMs which are not based on an unregistered template
+      are registered right away.
+    - A failed registration does not stop the others, the outcome of every
+      entity is returned, together with the critical path of the
+      registration.
+options:
+    storage_domains:
+        description:
+            - Names of the storage domains which contain the unregistered
+              entities.
+        type: list
+        required: true
+    concurrency:
+        description:
+            - Maximum number of registrations sent to the engine in parallel.
+        type: int
+        default: 10
+    allow_partial_import:
+        description:
+            - Register the entities even if some of their disks are missing.
+        type: bool
+    reassign_bad_macs:
+        description:
+            - Reassign the MAC addresses of the VMs which are out of the MAC
+              pool range.
+        type: bool
+    cluster_mappings:
+        description:
+            - Cluster map with C(source_name) and C(dest_name).
+        type: list
+    domain_mappings:
+        description:
+            - AAA domain map with C(source_name) and C(dest_name).
+        type: list
+    role_mappings:
+        description:
+            - Role map with C(source_name) and C(dest_name).
+        type: list
+    affinity_group_mappings:
+        description:
+            - Affinity group map with C(source_name) and C(dest_name).
+              Only used for VMs.
+        type: list
+    affinity_label_mappings:
+        description:
+            - Affinity label map with C(source_name) and C(dest_name).
+              Only used for VMs.
+        type: list
+    vnic_profile_mappings:
+        description:
+            - vNIC profile map with C(source_network_name),
+              C(source_profile_name) and C(target_profile_id).
+        type: list
+    lun_mappings:
+        description:
+            - Direct LUN map, as built by recover_engine.yml. Only used for
+              VMs.
+        type: list
+extends_documentation_fragment: ovirt
+'''
+
+EXAMPLES = '''
+- name: Register templates and VMs
+  ovirt_dr_bulk_register:
+      storage_domains:
+          - data_domain
+          - data_domain_2
+      concurrency: 10
+      allow_partial_import: True
+      cluster_mappings: "{{ dr_cluster_map }}"
+      auth: "{{ ovirt_auth }}"
+'''
+
+RETURN = '''
+registered_templates:
+    description: Templates which were registered, with the seconds it took.
+    returned: always
+    type: list
+    sample: [{"id": "123", "name": "tmpl1", "seconds": 2.1}]
+not_registered_templates:
+    description: Templates which failed to be registered, with the error.
+    returned: always
+    type: list
+    sample: [{"id": "456", "name": "tmpl2", "seconds": 0.4, "msg": "..."}]
+registered_vms:
+    description: VMs which were registered, with the seconds it took.
+    returned: always
+    type: list
+    sample: [{"id": "789", "name": "vm1", "seconds": 2.1}]
+not_registered_vms:
+    description: VMs which failed to be registered, with the error.
+    returned: always
+    type: list
+    sample: [{"id": "012", "name": "vm2", "seconds": 0.4, "msg": "..."}]
+unregistered_vms:
+    description: The unregistered VMs as found on the storage domains.
+    returned: always
+    type: list
+critical_path:
+    description:
+        - The chain of registrations which ended last. C(waited) is the
+          time a registration waited for a free worker after its template
+          was registered.
+    returned: always
+    type: list
+    sample: [{"type": "template", "name": "tmpl1", "seconds": 2.1,
+              "waited": 0.0},
+             {"type": "vm", "name": "vm1", "seconds": 1.5, "waited": 0.2}]
+seconds:
+    description: The seconds it took to register all the entities.
+    returned: always
+    type: float
+'''
+
+import time
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.ovirt import (
+    check_sdk,
+    get_dict_of_struct,
+    ovirt_full_argument_spec,
+)
+from ansible.module_utils.ovirt_dr import (
+    DependencyScheduler,
+    close_connection,
+    create_connection,
+    get_storage_domain,
+    registration_configuration,
+    vnic_profile_mappings,
+)
+
+# Templates can only be registered with these mappings.
+TEMPLATE_MAPPINGS = ['cluster_mappings', 'role_mappings', 'domain_mappings']
+
+
+def _entity_service(connection, sd_id, kind, entity_id):
+    sd_service = connection.system_service().storage_domains_service(
+    ).storage_domain_service(sd_id)
+    if kind == 'template':
+        return sd_service.templates_service().template_service(entity_id)
+    return sd_service.vms_service().vm_service(entity_id)
+
+
+def _register(sd_id, kind, entity_id, **kwargs):
+    return lambda connection: _entity_service(
+        connection, sd_id, kind, entity_id).register(**kwargs)
+
+
+def _base_template_id(template):
+    version = template.version
+    if version is None or version.base_template is None:
+        return None
+    return version.base_template.id
+
+
+def main():
+    argument_spec = ovirt_full_argument_spec(
+        storage_domains=dict(type='list', required=True),
+        concurrency=dict(type='int', default=10),
+        allow_partial_import=dict(type='bool'),
+        reassign_bad_macs=dict(type='bool'),
+        cluster_mappings=dict(type='list'),
+        domain_mappings=dict(type='list'),
+        role_mappings=dict(type='list'),
+        affinity_group_mappings=dict(type='list'),
+        affinity_label_mappings=dict(type='list'),
+        vnic_profile_mappings=dict(type='list'),
+        lun_mappings=dict(type='list'),
+    )
+    module = AnsibleModule(argument_spec=argument_spec)
+    check_sdk(module)
+
+    auth = module.params.pop('auth')
+    params = module.params
+    connection = create_connection(auth)
+    result = dict(
+        registered_templates=[],
+        not_registered_templates=[],
+        registered_vms=[],
+        not_registered_vms=[],
+        unregistered_vms=[],
+        critical_path=[],
+    )
+    try:
+        scheduler = DependencyScheduler(auth, params['concurrency'])
+        names = {}
+        vnic_profiles = vnic_profile_mappings(
+            params['vnic_profile_mappings']) or None
+        template_configuration = registration_configuration(
+            dict((key, params[key]) for key in TEMPLATE_MAPPINGS))
+        vm_configuration = registration_configuration(params)
+        for name in params['storage_domains']:
+            sd_service = get_storage_domain(connection, name)
+            sd_id = sd_service.get().id
+            for template in sd_service.templates_service().list(
+                    unregistered=True):
+                key = ('template', template.id)
+                names[key] = template.name
+                base_id = _base_template_id(template)
+                scheduler.add(
+                    key,
+                    _register(
+                        sd_id, 'template', template.id,
+                        allow_partial_import=params['allow_partial_import'],
+                        vnic_profile_mappings=vnic_profiles,
+                        registration_configuration=template_configuration,
+                    ),
+                    depends_on=[('template', base_id)] if base_id else [],
+                )
+            for vm in sd_service.vms_service().list(unregistered=True):
+                key = ('vm', vm.id)
+                names[key] = vm.name
+                result['unregistered_vms'].append(get_dict_of_struct(vm))
+                scheduler.add(
+                    key,
+                    _register(
+                        sd_id, 'vm', vm.id,
+                        allow_partial_import=params['allow_partial_import'],
+                        reassign_bad_macs=params['reassign_bad_macs'],
+                        vnic_profile_mappings=vnic_profiles,
+                        registration_configuration=vm_configuration,
+                    ),
+                    depends_on=[('template', vm.template.id)]
+                    if vm.template is not None else [],
+                )
+
+        started = time.time()
+        outcomes = scheduler.run()
+        result['seconds'] = round(time.time() - started, 3)
+        for key, (value, error, begin, end) in outcomes.items():
+            kind, entity_id = key
+            outcome = {'id': entity_id, 'name': names[key],
+                       'seconds': round(end - begin, 3)}
+            if error is None:
+                result['registered_%ss' % kind].append(outcome)
+            else:
+                outcome['msg'] = str(error)
+                result['not_registered_%ss' % kind].append(outcome)
+        result['critical_path'] = [
+            {'type': key[0], 'name': names[key],
+             'seconds': round(seconds, 3), 'waited': round(waited, 3)}
+            for key, seconds, waited in scheduler.critical_path(outcomes)
+        ]
+        module.exit_json(
+            changed=bool(result['registered_templates']
+                         or result['registered_vms']),
+            **result
+        )
+    except Exception as e:
+        module.fail_json(msg=str(e), exception=traceback.format_exc(),
+                         **result)
+    finally:
+        close_connection(connection, auth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: ovirt_dr_bulk_shutdown
+short_description: Force the VMs of storage domains down in bulk
+description:
+    - Stop all the VMs which are not down and have disks on the given
+      storage domains, keeping up to C(max_in_flight) forced stop
+      requests in flight on a single SDK connection.
+    - Then repeat the searches of the VMs which are not down on the
+      storage domains, until none of the stopped VMs is found anymore or
+      C(timeout) expires.
+    - The module fails if a VM could not be stopped or is not down in
+      time, and returns the outcome of every VM.
+options:
+    storages:
+        description:
+            - Storage domains whose VMs are stopped, as
+              C(dr_import_storages) entries of the mapping var file.
+        type: list
+        required: true
+    source_map:
+        description:
+            - Site the VMs are stopped in, the C(dr_source_map) of the play.
+        required: true
+    max_in_flight:
+        description:
+            - Maximum number of stop requests sent to the engine in
+              parallel.
+        type: int
+        default: 10
+    timeout:
+        description:
+            - Seconds to wait for all the VMs to be down.
+        type: int
+        default: 600
+    poll_interval:
+        description:
+            - Seconds between the status checks of the VMs.
+        type: int
+        default: 3
+extends_documentation_fragment: ovirt
+'''
+
+EXAMPLES = '''
+- name: Shutdown running VMs
+  ovirt_dr_bulk_shutdown:
+      storages: "{{ dr_import_storages }}"
+      source_map: primary
+      max_in_flight: 20
+      auth: "{{ ovirt_auth }}"
+'''
+
+RETURN = '''
+down:
+    description:
+        - VMs which were stopped, with the seconds from their stop request
+          until they were seen down.
+    returned: always
+    type: list
+    sample: [{"id": "123", "name": "vm1", "seconds": 6.2}]
+not_stopped:
+    description: VMs whose stop request failed, with the error.
+    returned: always
+    type: list
+    sample: [{"id": "456", "name": "vm2", "msg": "..."}]
+not_down:
+    description: VMs which were not down when the timeout expired.
+    returned: always
+    type: list
+    sample: [{"id": "789", "name": "vm3", "status": "powering_down"}]
+seconds:
+    description: The seconds it took to stop all the VMs.
+    returned: always
+    type: float
+'''
+
+import time
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.ovirt import check_sdk, ovirt_full_argument_spec
+from ansible.module_utils.ovirt_dr import (
+    RequestWindow,
+    close_connection,
+    create_connection,
+)
+
+
+def _running_vms(vms_service, storages, prefix):
+    """
+    Return the VMs which are not down on the storage domains, each VM once
+    even if it has disks on several of them.
+    """
+    vms = {}
+    for storage in storages:
+        for vm in vms_service.list(
+                search='status != down and storage.name=%s and '
+                       'datacenter=%s' % (storage[prefix + 'name'],
+                                          storage[prefix + 'dc_name'])):
+            vms.setdefault(vm.id, vm)
+    return list(vms.values())
+
+
+def _wait_for_down(vms_service, storages, prefix, pending, timeout,
+                   poll_interval):
+    """
+    Poll the VMs which are not down on the storage domains, with the same
+    searches as _running_vms, until the 'pending' VMs, a dict of ID to the
+    time their stop was sent, dropped out of them. Return a dict of ID to
+    seconds until down, and a dict of ID to the last status seen. The VMs
+    which are left in 'pending' are not down.
+    """
+    down = {}
+    statuses = {}
+    deadline = time.time() + timeout
+    while pending:
+        running = dict((vm.id, vm.status)
+                       for vm in _running_vms(vms_service, storages, prefix))
+        statuses.update(running)
+        for vm_id in [vm_id for vm_id in pending if vm_id not in running]:
+            down[vm_id] = time.time() - pending.pop(vm_id)
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(poll_interval)
+    return down, statuses
+
+
+def main():
+    argument_spec = ovirt_full_argument_spec(
+        storages=dict(type='list', required=True),
+        source_map=dict(required=True),
+        max_in_flight=dict(type='int', default=10),
+        timeout=dict(type='int', default=600),
+        poll_interval=dict(type='int', default=3),
+    )
+    module = AnsibleModule(argument_spec=argument_spec)
+    check_sdk(module)
+
+    auth = module.params.pop('auth')
+    params = module.params
+    prefix = 'dr_%s_' % params['source_map']
+    connection = create_connection(auth, params['max_in_flight'])
+    result = dict(down=[], not_stopped=[], not_down=[])
+    try:
+        started = time.time()
+        vms_service = connection.system_service().vms_service()
+        vms = _running_vms(vms_service, params['storages'], prefix)
+        names = dict((vm.id, vm.name) for vm in vms)
+
+        window = RequestWindow(params['max_in_flight'])
+        pending = {}
+
+        def _collect():
+            vm, value, error, seconds = window.wait_next()
+            if error is not None:
+                pending.pop(vm.id, None)
+                result['not_stopped'].append(
+                    {'id': vm.id, 'name': vm.name, 'msg': str(error)})
+
+        for vm in vms:
+            if window.full():
+                _collect()
+            pending[vm.id] = time.time()
+            window.submit(vm, lambda vm=vm: vms_service.vm_service(
+                vm.id).stop(force=True, wait=False))
+        while window:
+            _collect()
+
+        down, statuses = _wait_for_down(vms_service, params['storages'],
+                                        prefix, pending, params['timeout'],
+                                        params['poll_interval'])
+        result['down'] = sorted([
+            {'id': vm_id, 'name': names[vm_id], 'seconds': round(seconds, 3)}
+            for vm_id, seconds in down.items()
+        ], key=lambda vm: vm['name'])
+        result['not_down'] = sorted([
+            {'id': vm_id, 'name': names[vm_id],
+             'status': str(statuses[vm_id])}
+            for vm_id in pending
+        ], key=lambda vm: vm['name'])
+        result['seconds'] = round(time.time() - started, 3)
+        if result['not_stopped'] or result['not_down']:
+            module.fail_json(
+                msg="VMs which are not down: %s" % ', '.join(
+                    sorted([vm['name'] for vm in result['not_stopped']]
+                           + [vm['name'] for vm in result['not_down']])),
+                changed=bool(vms),
+                **result
+            )
+        module.exit_json(changed=bool(vms), **result)
+    except Exception as e:
+        module.fail_json(msg=str(e), exception=traceback.format_exc(),
+                         **result)
+    finally:
+        close_connection(connection, auth)
+
+
+if __name__ == '__main__':
+    main()
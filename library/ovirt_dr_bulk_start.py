@@ -0,0 +1,275 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: ovirt_dr_bulk_start
+short_description: Start VMs in bulk, wave after wave
+description:
+    - Start the given VMs in waves. The highly available VMs are started
+      first, then the VMs of every configured wave, and at last the rest
+      of the VMs.
+    - Every wave keeps up to C(max_in_flight) start requests in flight
+      on a single SDK connection, and may wait until its VMs are up
+      before the next wave is started.
+    - A failed start does not stop the others, the outcome of every VM
+      is returned, together with the time-to-up percentiles of every
+      wave.
+options:
+    vms:
+        description:
+            - VMs to start, each with C(id), C(name) and optionally
+              C(high_availability).
+        type: list
+        required: true
+    waves:
+        description:
+            - Waves to start after the highly available VMs, in order.
+            - Each wave has a C(name), and either a C(tag) whose VMs are
+              in the wave, or a C(vms) list of VM names.
+            - A VM is only started in the first wave it belongs to.
+        type: list
+        default: []
+    ha_first:
+        description:
+            - Start the highly available VMs in a wave of their own,
+              before all the other waves.
+        type: bool
+        default: true
+    max_in_flight:
+        description:
+            - Maximum number of start requests sent to the engine in
+              parallel.
+        type: int
+        default: 10
+    wait:
+        description:
+            - Wait until the VMs of a wave are up before the next wave is
+              started.
+        type: bool
+        default: false
+    timeout:
+        description:
+            - Seconds to wait for the VMs of a wave to be up.
+        type: int
+        default: 600
+    poll_interval:
+        description:
+            - Seconds between the status checks of a wave.
+        type: int
+        default: 3
+extends_documentation_fragment: ovirt
+'''
+
+EXAMPLES = '''
+- name: Start VMs
+  ovirt_dr_bulk_start:
+      vms: "{{ unreg_vms }}"
+      waves:
+          - name: databases
+            tag: dr_db
+          - name: frontends
+            vms: [web1, web2]
+      max_in_flight: 20
+      wait: True
+      auth: "{{ ovirt_auth }}"
+'''
+
+RETURN = '''
+started:
+    description: Names of the VMs which were started.
+    returned: always
+    type: list
+not_started:
+    description: VMs which failed to be started, with the error.
+    returned: always
+    type: list
+    sample: [{"id": "456", "name": "vm2", "msg": "..."}]
+waves:
+    description:
+        - Summary of every wave which had VMs. C(time_to_up) holds the
+          percentiles of the seconds from the start request until the VM
+          was seen up, and is only set when waiting.
+    returned: always
+    type: list
+    sample: [{"name": "high_availability", "vms": 12, "started": 12,
+              "failed": 0, "seconds": 41.2, "up": 12, "not_up": [],
+              "time_to_up": {"p50": 20.1, "p90": 35.0, "p99": 40.8,
+                             "max": 40.9}}]
+'''
+
+import math
+import time
+import traceback
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.ovirt import check_sdk, ovirt_full_argument_spec
+from ansible.module_utils.ovirt_dr import (
+    RequestWindow,
+    close_connection,
+    create_connection,
+    search_vms_by_name,
+)
+
+try:
+    import ovirtsdk4.types as otypes
+except ImportError:
+    pass
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def _at(fraction):
+        # Nearest-rank percentile.
+        return round(values[max(0, int(math.ceil(fraction * len(values)))
+                                - 1)], 3)
+
+    return {'p50': _at(0.5), 'p90': _at(0.9), 'p99': _at(0.99),
+            'max': round(values[-1], 3)}
+
+
+def split_waves(vms, waves, tagged, ha_first):
+    """
+    Split the VMs in (name, vms) waves. 'tagged' maps the tag of a wave to
+    the IDs of its VMs.
+    """
+    result = []
+    if ha_first:
+        result.append(('high_availability', [
+            vm for vm in vms
+            if (vm.get('high_availability') or {}).get('enabled')
+        ]))
+    for wave in waves:
+        if wave.get('tag'):
+            ids = tagged[wave['tag']]
+            result.append((wave['name'],
+                           [vm for vm in vms if vm['id'] in ids]))
+        else:
+            names = set(wave.get('vms') or [])
+            result.append((wave['name'],
+                           [vm for vm in vms if vm['name'] in names]))
+    result.append(('rest', list(vms)))
+    # Only keep every VM in the first wave it belongs to.
+    taken = set()
+    for name, members in result:
+        members[:] = [vm for vm in members if vm['id'] not in taken]
+        taken.update(vm['id'] for vm in members)
+    return [(name, members) for name, members in result if members]
+
+
+def _wait_for_up(vms_service, pending, timeout, poll_interval):
+    """
+    Poll the status of the 'pending' VMs, a dict of name to the time
+    their start was sent, and return a dict of name to seconds until up.
+    """
+    up = {}
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        time.sleep(poll_interval)
+        for vm in search_vms_by_name(vms_service, list(pending)):
+            if vm.name in pending and vm.status == otypes.VmStatus.UP:
+                up[vm.name] = time.time() - pending.pop(vm.name)
+    return up
+
+
+def _start_wave(vms_service, members, params, started, not_started):
+    summary = {'vms': len(members), 'started': 0, 'failed': 0}
+    begin = time.time()
+    names = [vm['name'] for vm in members]
+    running = set(
+        vm.name for vm in search_vms_by_name(vms_service, names)
+        if vm.status == otypes.VmStatus.UP
+    )
+    window = RequestWindow(params['max_in_flight'])
+    pending = {}
+
+    def _collect():
+        vm, value, error, seconds = window.wait_next()
+        if error is None:
+            started.append(vm['name'])
+            summary['started'] += 1
+        else:
+            pending.pop(vm['name'], None)
+            not_started.append({'id': vm['id'], 'name': vm['name'],
+                                'msg': str(error)})
+            summary['failed'] += 1
+
+    for vm in members:
+        if vm['name'] in running:
+            started.append(vm['name'])
+            summary['started'] += 1
+            continue
+        if window.full():
+            _collect()
+        pending[vm['name']] = time.time()
+        window.submit(vm, lambda vm=vm: vms_service.vm_service(
+            vm['id']).start(wait=False))
+    while window:
+        _collect()
+
+    if params['wait']:
+        up = _wait_for_up(vms_service, pending, params['timeout'],
+                          params['poll_interval'])
+        summary['up'] = len(up) + len(
+            [name for name in names if name in running])
+        summary['not_up'] = sorted(pending)
+        summary['time_to_up'] = percentiles(list(up.values()))
+    summary['seconds'] = round(time.time() - begin, 3)
+    return summary
+
+
+def main():
+    argument_spec = ovirt_full_argument_spec(
+        vms=dict(type='list', required=True),
+        waves=dict(type='list', default=[]),
+        ha_first=dict(type='bool', default=True),
+        max_in_flight=dict(type='int', default=10),
+        wait=dict(type='bool', default=False),
+        timeout=dict(type='int', default=600),
+        poll_interval=dict(type='int', default=3),
+    )
+    module = AnsibleModule(argument_spec=argument_spec)
+    check_sdk(module)
+
+    auth = module.params.pop('auth')
+    params = module.params
+    connection = create_connection(auth, params['max_in_flight'])
+    started = []
+    not_started = []
+    waves = []
+    try:
+        vms_service = connection.system_service().vms_service()
+        tagged = dict(
+            (wave['tag'], set(
+                vm.id for vm in vms_service.list(search='tag=%s' % wave['tag'])
+            ))
+            for wave in params['waves'] if wave.get('tag')
+        )
+        for name, members in split_waves(params['vms'], params['waves'],
+                                         tagged, params['ha_first']):
+            summary = _start_wave(vms_service, members, params, started,
+                                  not_started)
+            summary['name'] = name
+            waves.append(summary)
+        module.exit_json(changed=len(started) > 0, started=started,
+                         not_started=not_started, waves=waves)
+    except Exception as e:
+        module.fail_json(msg=str(e), exception=traceback.format_exc(),
+                         started=started, not_started=not_started,
+                         waves=waves)
+    finally:
+        close_connection(connection, auth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+ANSIBLE_METADATA = {'metadata_version': '1.1',
+                    'status': ['preview'],
+                    'supported_by': 'community'}
+
+DOCUMENTATION = '''
+---
+module: ovirt_dr_bulk_update_ovf
+short_description: Update the OVF_STORE disks of storage domains in bulk
+description:
+    - Trigger the update of the OVF_STORE disks of all the given storage
+      domains which are active, keeping up to C(max_in_flight) requests
+      in flight on a single SDK connection.
+    - Every update is sent with a correlation ID of its own, and the
+      engine jobs of all the updates are then polled together, until all
+      of them ended or C(timeout) expires.
+    - The module fails if an update failed or did not end in time, and
+      returns the outcome of every storage domain.
+options:
+    storages:
+        description:
+            - Storage domains to update, as C(dr_import_storages) entries
+              of the mapping var file.
+        type: list
+        required: true
+    source_map:
+        description:
+            - Site the storage domains are updated in, the
+              C(dr_source_map) of the play.
+        required: true
+    max_in_flight:
+        description:
+            - Maximum number of update requests sent to the engine in
+              parallel.
+        type: int
+        default: 10
+    timeout:
+        description:
+            - Seconds to wait for all the OVF_STORE disks to be written.
+        type: int
+        default: 600
+    poll_interval:
+        description:
+            - Seconds between the status checks of the jobs.
+        type: int
+        default: 3
+extends_documentation_fragment: ovirt
+'''
+
+EXAMPLES = '''
+- name: Update OVF_STORE disks
+  ovirt_dr_bulk_update_ovf:
+      storages: "{{ dr_import_storages }}"
+      source_map: primary
+      auth: "{{ ovirt_auth }}"
+'''
+
+RETURN = '''
+updated:
+    description:
+        - Storage domains whose OVF_STORE disks were written, with the
+          seconds from the update request until its job ended.
+    returned: always
+    type: list
+    sample: [{"name": "data1", "seconds": 12.4}]
+failed:
+    description:
+        - Storage domains whose update failed or did not end in time,
+          with the error.
+    returned: always
+    type: list
+    sample: [{"name": "data2", "seconds": 600.2, "msg": "..."}]
+skipped:
+    description: Names of the storage domains which are not active.
+    returned: always
+    type: list
+seconds:
+    description: The seconds it took to update all the storage domains.
+    returned: always
+    type: float
+'''
+
+import time
+import traceback
+import uuid
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.ovirt import check_sdk, ovirt_full_argument_spec
+from ansible.module_utils.ovirt_dr import (
+    RequestWindow,
+    close_connection,
+    create_connection,
+)
+
+try:
+    import ovirtsdk4.types as otypes
+except ImportError:
+    pass
+
+
+def _job_status(jobs):
+    """
+    Return whether the jobs of an update are still running, and the error
+    of the first of them which failed. An update may have more than one
+    job, and it ended once all of them ended. An update without jobs yet
+    is still running, since its job may not have been created yet.
+    """
+    if not jobs:
+        return True, None
+    error = None
+    for job in jobs:
+        if job.status == otypes.JobStatus.STARTED:
+            return True, None
+        if job.status != otypes.JobStatus.FINISHED and error is None:
+            error = 'The job %s is %s' % (job.description, job.status)
+    return False, error
+
+
+def _wait_for_jobs(jobs_service, pending, limit, timeout, poll_interval):
+    """
+    Poll the jobs of the 'pending' updates, a dict of correlation ID to
+    the time the update was sent, and return a dict of correlation ID to
+    a tuple of (seconds, error) of the updates whose jobs ended. The
+    updates whose jobs were never found until the timeout expired end
+    with an error as well.
+
+    The engine can only search the jobs of one correlation ID at a time,
+    so the searches of every poll are sent together, up to 'limit' in
+    flight, instead of one after the other.
+    """
+    ended = {}
+    found = set()
+    deadline = time.time() + timeout
+    window = RequestWindow(limit)
+
+    def _collect():
+        correlation_id, jobs, error, seconds = window.wait_next()
+        running = False
+        if error is None:
+            if jobs:
+                found.add(correlation_id)
+            running, error = _job_status(jobs)
+        else:
+            error = str(error)
+        if not running:
+            ended[correlation_id] = (
+                time.time() - pending.pop(correlation_id), error)
+
+    while pending:
+        for correlation_id in list(pending):
+            if window.full():
+                _collect()
+            window.submit(
+                correlation_id,
+                lambda correlation_id=correlation_id: jobs_service.list(
+                    search='correlation_id=%s' % correlation_id,
+                    wait=False,
+                ),
+            )
+        while window:
+            _collect()
+        if not pending or time.time() >= deadline:
+            break
+        time.sleep(poll_interval)
+    for correlation_id in [correlation_id for correlation_id in pending
+                           if correlation_id not in found]:
+        ended[correlation_id] = (
+            time.time() - pending.pop(correlation_id),
+            'No job found for correlation id %s' % correlation_id)
+    return ended
+
+
+def main():
+    argument_spec = ovirt_full_argument_spec(
+        storages=dict(type='list', required=True),
+        source_map=dict(required=True),
+        max_in_flight=dict(type='int', default=10),
+        timeout=dict(type='int', default=600),
+        poll_interval=dict(type='int', default=3),
+    )
+    module = AnsibleModule(argument_spec=argument_spec)
+    check_sdk(module)
+
+    auth = module.params.pop('auth')
+    params = module.params
+    prefix = 'dr_%s_' % params['source_map']
+    connection = create_connection(auth, params['max_in_flight'])
+    result = dict(updated=[], failed=[], skipped=[])
+    try:
+        started = time.time()
+        system_service = connection.system_service()
+        sds_service = system_service.storage_domains_service()
+        active = dict((sd.name, sd) for sd in sds_service.list(
+            search='status=active'))
+
+        window = RequestWindow(params['max_in_flight'])
+        names = {}
+        pending = {}
+
+        def _collect():
+            correlation_id, value, error, seconds = window.wait_next()
+            if error is not None:
+                pending.pop(correlation_id, None)
+                result['failed'].append({'name': names[correlation_id],
+                                         'seconds': round(seconds, 3),
+                                         'msg': str(error)})
+
+        for storage in params['storages']:
+            name = storage[prefix + 'name']
+            if name not in active:
+                result['skipped'].append(name)
+                continue
+            correlation_id = str(uuid.uuid4())
+            names[correlation_id] = name
+            if window.full():
+                _collect()
+            pending[correlation_id] = time.time()
+            sd_service = sds_service.storage_domain_service(active[name].id)
+            window.submit(
+                correlation_id,
+                lambda sd_service=sd_service, correlation_id=correlation_id:
+                    sd_service.update_ovf_store(
+                        query={'correlation_id': correlation_id},
+                        wait=False,
+                    ),
+            )
+        while window:
+            _collect()
+
+        ended = _wait_for_jobs(system_service.jobs_service(), pending,
+                               params['max_in_flight'], params['timeout'],
+                               params['poll_interval'])
+        for correlation_id, (seconds, error) in ended.items():
+            outcome = {'name': names[correlation_id],
+                       'seconds': round(seconds, 3)}
+            if error is None:
+                result['updated'].append(outcome)
+            else:
+                outcome['msg'] = error
+                result['failed'].append(outcome)
+        for correlation_id, sent in pending.items():
+            result['failed'].append({
+                'name': names[correlation_id],
+                'seconds': round(time.time() - sent, 3),
+                'msg': "The OVF_STORE update did not end in %d seconds"
+                       % params['timeout'],
+            })
+        result['seconds'] = round(time.time() - started, 3)
+        if result['failed']:
+            module.fail_json(
+                msg="Failed to update the OVF_STORE disks of: %s" % ', '.join(
+                    sorted(outcome['name'] for outcome in result['failed'])),
+                changed=bool(names),
+                **result
+            )
+        module.exit_json(changed=bool(names), **result)
+    except Exception as e:
+        module.fail_json(msg=str(e), exception=traceback.format_exc(),
+                         **result)
+    finally:
+        close_connection(connection, auth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import collections
+import threading
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    import ovirtsdk4 as sdk
+    import ovirtsdk4.types as otypes
+except ImportError:
+    pass
+
+
+def create_connection(auth, connections=1):
+    """
+    Create an SDK connection out of the ovirt_auth fact.
+
+    The connection reuses the SSO token of ovirt_auth, and may send up to
+    'connections' requests to the engine in parallel.
+    """
+    url = auth.get('url')
+    if url is None and auth.get('hostname') is not None:
+        url = 'https://{0}/ovirt-engine/api'.format(auth.get('hostname'))
+    return sdk.Connection(
+        url=url,
+        username=auth.get('username'),
+        password=auth.get('password'),
+        ca_file=auth.get('ca_file', None),
+        insecure=auth.get('insecure', False),
+        token=auth.get('token', None),
+        kerberos=auth.get('kerberos', None),
+        headers=auth.get('headers', None),
+        connections=connections,
+    )
+
+
+def close_connection(connection, auth):
+    # Do not revoke the SSO token which is still used by the play.
+    connection.close(logout=auth.get('token') is None)
+
+
+class RequestWindow:
+    """
+    Keep up to 'limit' asynchronous SDK requests in flight.
+
+    submit() sends a request with wait=False, and wait_next() waits for
+    the oldest request in flight and returns its outcome as a tuple of
+    (key, value, error, seconds).
+    """
+
+    def __init__(self, limit):
+        self._limit = max(1, limit)
+        self._in_flight = collections.deque()
+
+    def __len__(self):
+        return len(self._in_flight)
+
+    def full(self):
+        return len(self._in_flight) >= self._limit
+
+    def submit(self, key, send):
+        started = time.time()
+        try:
+            self._in_flight.append((key, send(), None, started))
+        except Exception as e:
+            self._in_flight.append((key, None, e, started))
+
+    def wait_next(self):
+        key, future, error, started = self._in_flight.popleft()
+        value = None
+        if future is not None:
+            try:
+                value = future.wait()
+            except Exception as e:
+                error = e
+        return key, value, error, time.time() - started
+
+
+class DependencyScheduler:
+    """
+    Run tasks on up to 'workers' threads, each task as soon as all the
+    tasks it depends on finished, whatever their outcome.
+
+    Every worker thread gets its own SDK connection, since a connection
+    must not be shared between threads. A task is called with the
+    connection of the thread which runs it, which may send up to
+    'connections' asynchronous requests in parallel.
+    """
+
+    def __init__(self, auth, workers, connections=1):
+        self._auth = auth
+        self._workers = max(1, workers)
+        self._connections_per_worker = max(1, connections)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._tasks = collections.OrderedDict()
+        self._started = None
+
+    def add(self, key, run, depends_on=()):
+        self._tasks[key] = (run, [dep for dep in depends_on if dep != key])
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = create_connection(self._auth,
+                                           self._connections_per_worker)
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _call(self, run):
+        started = time.time()
+        try:
+            return run(self._connection()), None, started, time.time()
+        except Exception as e:
+            return None, e, started, time.time()
+
+    def run(self):
+        """
+        Run all the tasks and return a dict of key to a tuple of
+        (value, error, started, finished). Dependencies which are not tasks
+        of the scheduler are ignored.
+        """
+        self._started = time.time()
+        waiting = collections.OrderedDict(
+            (key, set(dep for dep in deps if dep in self._tasks))
+            for key, (run, deps) in self._tasks.items()
+        )
+        outcomes = {}
+        running = {}
+        try:
+            with ThreadPoolExecutor(max_workers=self._workers) as pool:
+                while waiting or running:
+                    for key in [k for k, deps in waiting.items() if not deps]:
+                        del waiting[key]
+                        future = pool.submit(self._call, self._tasks[key][0])
+                        running[future] = key
+                    if not running:
+                        raise Exception("Dependency cycle between: %s"
+                                        % ', '.join(map(str, waiting)))
+                    done, pending = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        key = running.pop(future)
+                        outcomes[key] = future.result()
+                        for deps in waiting.values():
+                            deps.discard(key)
+        finally:
+            for connection in self._connections:
+                close_connection(connection, self._auth)
+        return outcomes
+
+    def critical_path(self, outcomes):
+        """
+        Return the chain of tasks which ended last, from its first
+        dependency to the last task, as a list of tuples of
+        (key, seconds, waited). 'waited' is the time a task waited for a
+        free worker after its dependencies finished, or after the run
+        started.
+        """
+        if not outcomes:
+            return []
+        key = max(outcomes, key=lambda k: outcomes[k][3])
+        path = []
+        while key is not None:
+            value, error, started, finished = outcomes[key]
+            deps = [dep for dep in self._tasks[key][1] if dep in outcomes]
+            dep = max(deps, key=lambda d: outcomes[d][3]) if deps else None
+            ready = outcomes[dep][3] if dep is not None else self._started
+            path.insert(0, (key, finished - started, max(0, started - ready)))
+            key = dep
+        return path
+
+
+class HostCache:
+    """
+    Pick the up hosts of a data center round-robin, so the mounts and
+    iSCSI logins of many storage domains do not all land on one host.
+
+    The up hosts of a data center are listed once per run, on the
+    connection of the first thread which needs them, while the threads
+    which need the hosts of other data centers go on. A data center without
+    up hosts is listed again the next time. The cache may be shared by the
+    threads of a DependencyScheduler.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dc_locks = {}
+        self._hosts = {}
+        self._next = {}
+
+    def hosts(self, connection, dc_name):
+        with self._lock:
+            dc_lock = self._dc_locks.setdefault(dc_name, threading.Lock())
+        with dc_lock:
+            hosts = self._hosts.get(dc_name)
+            if not hosts:
+                hosts = connection.system_service().hosts_service().list(
+                    search='status=up and datacenter=%s' % dc_name)
+                if hosts:
+                    self._hosts[dc_name] = hosts
+            return hosts
+
+    def pick(self, connection, dc_name):
+        hosts = self.hosts(connection, dc_name)
+        if not hosts:
+            raise Exception("No hosts available")
+        with self._lock:
+            index = self._next.get(dc_name, 0)
+            self._next[dc_name] = index + 1
+        return hosts[index % len(hosts)]
+
+
+def get_storage_domain(connection, name):
+    sds_service = connection.system_service().storage_domains_service()
+    sds = sds_service.list(search='name=%s' % name)
+    if not sds:
+        raise Exception("Storage domain '%s' was not found" % name)
+    return sds_service.storage_domain_service(sds[0].id)
+
+
+def search_vms_by_name(vms_service, names, batch=50):
+    """
+    List the VMs with the given names, with one search per batch of names
+    instead of one request per VM.
+    """
+    for index in range(0, len(names), batch):
+        search = ' or '.join(
+            'name=%s' % name for name in names[index:index + batch])
+        for vm in vms_service.list(search=search):
+            yield vm
+
+
+def _cluster_mappings(mappings):
+    return [
+        otypes.RegistrationClusterMapping(
+            from_=otypes.Cluster(name=mapping['source_name']),
+            to=otypes.Cluster(
+                name=mapping['dest_name'],
+            ) if mapping['dest_name'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def _role_mappings(mappings):
+    return [
+        otypes.RegistrationRoleMapping(
+            from_=otypes.Role(name=mapping['source_name']),
+            to=otypes.Role(
+                name=mapping['dest_name'],
+            ) if mapping['dest_name'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def _domain_mappings(mappings):
+    return [
+        otypes.RegistrationDomainMapping(
+            from_=otypes.Domain(name=mapping['source_name']),
+            to=otypes.Domain(
+                name=mapping['dest_name'],
+            ) if mapping['dest_name'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def _affinity_group_mappings(mappings):
+    return [
+        otypes.RegistrationAffinityGroupMapping(
+            from_=otypes.AffinityGroup(name=mapping['source_name']),
+            to=otypes.AffinityGroup(
+                name=mapping['dest_name'],
+            ) if mapping['dest_name'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def _affinity_label_mappings(mappings):
+    return [
+        otypes.RegistrationAffinityLabelMapping(
+            from_=otypes.AffinityLabel(name=mapping['source_name']),
+            to=otypes.AffinityLabel(
+                name=mapping['dest_name'],
+            ) if mapping['dest_name'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def _lun_storage_type(storage_type):
+    if storage_type in ['iscsi', 'fcp']:
+        return otypes.StorageType(storage_type)
+    return None
+
+
+def _lun_mappings(mappings):
+    return [
+        otypes.RegistrationLunMapping(
+            from_=otypes.Disk(
+                lun_storage=otypes.HostStorage(
+                    type=_lun_storage_type(mapping['source_storage_type']),
+                    logical_units=[
+                        otypes.LogicalUnit(
+                            id=mapping['source_logical_unit_id'],
+                        )
+                    ],
+                ),
+            ) if mapping['source_logical_unit_id'] else None,
+            to=otypes.Disk(
+                lun_storage=otypes.HostStorage(
+                    type=_lun_storage_type(mapping['dest_storage_type']),
+                    logical_units=[
+                        otypes.LogicalUnit(
+                            id=mapping['dest_logical_unit_id'],
+                            port=mapping['dest_logical_unit_port'],
+                            portal=mapping['dest_logical_unit_portal'],
+                            address=mapping['dest_logical_unit_address'],
+                            target=mapping['dest_logical_unit_target'],
+                            password=mapping['dest_logical_unit_password'],
+                            username=mapping['dest_logical_unit_username'],
+                        )
+                    ],
+                ),
+            ) if mapping['dest_logical_unit_id'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def vnic_profile_mappings(mappings):
+    return [
+        otypes.VnicProfileMapping(
+            source_network_name=mapping['source_network_name'],
+            source_network_profile_name=mapping['source_profile_name'],
+            target_vnic_profile=otypes.VnicProfile(
+                id=mapping['target_profile_id'],
+            ) if mapping['target_profile_id'] else None,
+        ) for mapping in mappings or []
+    ]
+
+
+def registration_configuration(params):
+    """
+    Build the registration configuration of an unregistered entity out of
+    the maps which recover_engine.yml builds from the mapping var file.
+    """
+    keys = ['cluster_mappings', 'role_mappings', 'domain_mappings',
+            'lun_mappings', 'affinity_group_mappings',
+            'affinity_label_mappings']
+    if not any(params.get(key) for key in keys):
+        return None
+    return otypes.RegistrationConfiguration(
+        cluster_mappings=_cluster_mappings(params.get('cluster_mappings')),
+        role_mappings=_role_mappings(params.get('role_mappings')),
+        domain_mappings=_domain_mappings(params.get('domain_mappings')),
+        lun_mappings=_lun_mappings(params.get('lun_mappings')),
+        affinity_group_mappings=_affinity_group_mappings(
+            params.get('affinity_group_mappings')),
+        affinity_label_mappings=_affinity_label_mappings(
+            params.get('affinity_label_mappings')),
+    )
@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'filter_plugins'))
+
+from dr_filters import dr_build_maps  # noqa: E402
+
+# The expression of the former "Set Network Map" task of
+# recover_engine.yml, which was templated once per mapping.
+NETWORK_MAP_TASK = '''{{ dr_network_map }} + {{ [
+          {
+              'source_network_name': item[dr_source_map + '_network_name'] | default('EMPTY_ELEMENT', true),
+              'source_profile_name': item[dr_source_map + '_profile_name'] | default('EMPTY_ELEMENT', true),
+              'target_network_dc': item[dr_target_host + '_network_dc'] | default('EMPTY_ELEMENT', true),
+              'target_profile_id': item[dr_target_host + '_profile_id'] | default('00000000-0000-0000-0000-000000000000', true)
+          }
+          ] }}'''  # noqa: E501
+
+
+def network_mappings(count):
+    return [
+        {
+            'primary_network_name': 'ovirtmgmt-%d' % i,
+            'primary_profile_name': 'profile-%d' % i,
+            'primary_profile_id': '%032x' % i,
+            'secondary_network_name': 'ovirtmgmt-%d' % i,
+            'secondary_profile_name': 'profile-%d' % i,
+            'secondary_profile_id': '%032x' % (i + 1),
+            'secondary_network_dc': 'Default',
+        } for i in range(count)
+    ]
+
+
+def set_fact_loop_templar(mappings):
+    """
+    Run the former task with ansible's Templar, the way set_fact with
+    with_items did: the whole list is templated again on every item.
+    """
+    from ansible.parsing.dataloader import DataLoader
+    from ansible.template import Templar
+
+    variables = {'dr_network_map': [], 'dr_source_map': 'primary',
+                 'dr_target_host': 'secondary'}
+    templar = Templar(loader=DataLoader(), variables=variables)
+    for item in mappings:
+        variables['item'] = item
+        templar.available_variables = variables
+        variables['dr_network_map'] = templar.template(NETWORK_MAP_TASK)
+    return variables['dr_network_map']
+
+
+def set_fact_loop_emulated(mappings):
+    """
+    Emulate the former task without ansible: the list so far is rendered
+    to text and parsed back on every item.
+    """
+    network_map = []
+    for item in mappings:
+        entry = dr_build_maps({'dr_network_mappings': [item]},
+                              'primary', 'secondary')['dr_network_map']
+        network_map = ast.literal_eval(repr(network_map)) + entry
+    return network_map
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the dr_build_maps filter against the "
+                    "former set_fact loop of recover_engine.yml")
+    parser.add_argument('--count', type=int, nargs='+',
+                        default=[250, 500, 1000, 2000],
+                        help="number of vNIC profile mappings")
+    args = parser.parse_args()
+
+    try:
+        import ansible.template  # noqa: F401
+        set_fact_loop = set_fact_loop_templar
+        engine = 'templar'
+    except ImportError:
+        set_fact_loop = set_fact_loop_emulated
+        engine = 'emulated'
+
+    print("%8s %12s %16s" % ('mappings', 'filter (s)',
+                             'set_fact %s (s)' % engine))
+    for count in args.count:
+        mappings = network_mappings(count)
+        start = time.time()
+        maps = dr_build_maps({'dr_network_mappings': mappings},
+                             'primary', 'secondary')
+        filter_time = time.time() - start
+        start = time.time()
+        expected = set_fact_loop(mappings)
+        loop_time = time.time() - start
+        assert maps['dr_network_map'] == expected
+        print("%8d %12.4f %16.4f" % (count, filter_time, loop_time))
+
+
+if __name__ == '__main__':
+    main()
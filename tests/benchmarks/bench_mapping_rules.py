@@ -0,0 +1,88 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'files'))
+
+from mapping_rules import check_mappings, duplicates  # noqa: E402
+
+
+def var_file(count):
+    """
+    Return a synthetic mapping var file with 'count' network mappings and
+    'count' LUN mappings, without any violation.
+    """
+    return {
+        'dr_network_mappings': [
+            {
+                'primary_network_name': 'ovirtmgmt-%d' % i,
+                'primary_profile_name': 'profile-%d' % i,
+                'primary_network_dc': 'Default',
+                'secondary_network_name': 'ovirtmgmt-%d' % i,
+                'secondary_profile_name': 'profile-%d' % i,
+                'secondary_network_dc': 'Default',
+            } for i in range(count)
+        ],
+        'dr_lun_mappings': [
+            {
+                'primary_logical_unit_id': '%032x' % i,
+                'secondary_logical_unit_id': '%032x' % (i + count),
+            } for i in range(count)
+        ],
+    }
+
+
+def network_dups_quadratic(attributes):
+    """
+    The former duplicate detection of the networks of a setup.
+    """
+    return [x for n, x in enumerate(attributes) if x in attributes[:n]]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the duplicate detection of the mapping "
+                    "validator")
+    parser.add_argument('--count', type=int, nargs='+',
+                        default=[1000, 10000, 100000],
+                        help="number of network and of LUN mappings")
+    parser.add_argument('--quadratic-limit', type=int, default=10000,
+                        help="largest count to run the former quadratic "
+                             "detection with")
+    args = parser.parse_args()
+
+    print("%8s %12s %16s %14s" % ('mappings', 'rules (s)', 'network dups (s)',
+                                  'quadratic (s)'))
+    for count in args.count:
+        mappings = var_file(count)
+        start = time.time()
+        violations = check_mappings(mappings)
+        rules_time = time.time() - start
+        assert violations == []
+
+        attributes = ['_'.join((m['primary_profile_name'],
+                                m['primary_network_name'],
+                                m['primary_network_dc']))
+                      for m in mappings['dr_network_mappings']]
+        start = time.time()
+        assert duplicates(attributes) == set()
+        dups_time = time.time() - start
+
+        quadratic = '-'
+        if count <= args.quadratic_limit:
+            start = time.time()
+            assert network_dups_quadratic(attributes) == []
+            quadratic = '%.4f' % (time.time() - start)
+        print("%8d %12.4f %16.4f %14s" % (count, rules_time, dups_time,
+                                          quadratic))
+
+
+if __name__ == '__main__':
+    main()
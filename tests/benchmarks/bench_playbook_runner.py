@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'files'))
+
+from playbook_runner import LogFile, run_playbook  # noqa: E402
+
+# Synthetic '-vvv' playbook output: a task header, a verbose module
+# invocation dump and a result line, with a deprecation warning on stderr
+# every few tasks, written as fast as the pipe accepts it.
+REPLAY = r'''
+import sys
+size = int(sys.argv[1]) * 1024 * 1024
+result = "ok: [localhost] => " + repr({
+    "changed": True,
+    "vm": {"id": "9b5d4b4e-1f3a-4c7f-8f1e-0a6b5a0c5e21",
+           "name": "vm_name", "status": "up",
+           "disks": ["disk-%d" % i for i in range(40)]},
+    "invocation": {"module_args": {"state": "registered",
+                                   "cluster_mappings": [] }}}) + "\n"
+block = ("\nTASK [oVirt.disaster-recovery : Register VMs] "
+         + "*" * 60 + "\n"
+         + "task path: /usr/share/ansible/roles/register_vm.yml:2\n"
+         + result * 8)
+warning = "[DEPRECATION WARNING]: synthetic stderr line\n"
+written = 0
+count = 0
+while written < size:
+    sys.stdout.write(block)
+    written += len(block)
+    count += 1
+    if count % 4 == 0:
+        sys.stderr.write(warning)
+        written += len(warning)
+sys.stdout.flush()
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay synthetic ansible-playbook output through the "
+                    "playbook runner output pump.")
+    parser.add_argument("--size-mb", type=int, default=2048,
+                        help="Amount of output to replay in MB "
+                             "(default: 2048)")
+    parser.add_argument("--log-file",
+                        help="Log file to write (default: temporary file)")
+    args = parser.parse_args()
+
+    log_file = args.log_file
+    if log_file is None:
+        fd, log_file = tempfile.mkstemp(prefix="bench-ovirt-dr-",
+                                        suffix=".log")
+        os.close(fd)
+
+    counters = {'lines': 0, 'tasks': 0, 'stderr': 0}
+    command = [sys.executable, "-c", REPLAY, str(args.size_mb)]
+    start = time.time()
+    with LogFile(log_file) as f:
+        def _stdout(line):
+            counters['lines'] += 1
+            if 'TASK [' in line:
+                counters['tasks'] += 1
+            f.write(line)
+
+        def _stderr(line):
+            counters['stderr'] += 1
+            f.write(line)
+
+        result = run_playbook(command, _stdout, _stderr)
+    elapsed = time.time() - start
+    size = os.path.getsize(log_file)
+    if args.log_file is None:
+        os.remove(log_file)
+
+    print("return code:   %s" % result.returncode)
+    print("stdout lines:  %d" % counters['lines'])
+    print("tasks:         %d" % counters['tasks'])
+    print("stderr lines:  %d" % counters['stderr'])
+    print("log size:      %.1f MB" % (size / 1024.0 / 1024.0))
+    print("elapsed:       %.2f s" % elapsed)
+    print("throughput:    %.1f MB/s" % (size / 1024.0 / 1024.0 / elapsed))
+
+
+if __name__ == "__main__":
+    main()
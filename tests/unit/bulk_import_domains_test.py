@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import ovirtsdk4 as sdk
+import ovirtsdk4.types as otypes
+
+from ansible.module_utils.ovirt_dr import HostCache
+from ovirt_dr_bulk_import_domains import _add_domain
+
+PREFIX = 'dr_secondary_'
+PARAMS = {'max_logins_in_flight': 2, 'timeout': 1, 'poll_interval': 0}
+
+
+class Future:
+
+    def __init__(self, value=None):
+        self.value = value
+
+    def wait(self):
+        return self.value
+
+
+class Connection:
+    """
+    Stand-in for an SDK connection to a setup with the data center 'dc',
+    one up host 'host1' and the storage domains in 'domains'. Every
+    service of the connection is the connection itself, and every request
+    is recorded in 'calls'.
+    """
+
+    def __init__(self, domains=(), attached=()):
+        self.domains = dict((sd.id, sd) for sd in domains)
+        self.attached = list(attached)
+        self.calls = []
+
+    def system_service(self):
+        return self
+
+    data_centers_service = hosts_service = storage_domains_service = \
+        system_service
+
+    def data_center_service(self, dc_id):
+        return self
+
+    def host_service(self, host_id):
+        return self
+
+    def list(self, search=None):
+        self.calls.append(('list', search))
+        if search == 'name=dc':
+            return [otypes.DataCenter(id='dc1', name='dc')]
+        if search == 'status=up and datacenter=dc':
+            return [otypes.Host(id='h1', name='host1')]
+        if search is None:
+            return [otypes.StorageDomain(id=sd_id) for sd_id in self.attached]
+        return [sd for sd in self.domains.values()
+                if search == 'name=%s' % sd.name]
+
+    def iscsi_login(self, iscsi, wait=True):
+        self.calls.append(('iscsi_login', iscsi.target))
+        return Future()
+
+    def add(self, sd):
+        self.calls.append(('add', sd))
+        if sd.storage is None:
+            # The domain is attached to the data center.
+            self.attached.append(sd.id)
+            return sd
+        sd = otypes.StorageDomain(id=sd.id or 'new', name=sd.name)
+        self.domains[sd.id] = sd
+        return sd
+
+    def storage_domain_service(self, sd_id):
+        return StorageDomainService(self, sd_id)
+
+
+class StorageDomainService:
+
+    def __init__(self, connection, sd_id):
+        self.connection = connection
+        self.sd_id = sd_id
+
+    def get(self):
+        if self.sd_id not in self.connection.domains:
+            raise sdk.NotFoundError("not found")
+        return otypes.StorageDomain(
+            id=self.sd_id, status=otypes.StorageDomainStatus.ACTIVE)
+
+
+def _storage(domain_type, **kwargs):
+    storage = {'dr_domain_type': domain_type, 'dr_domain_id': 'sd1',
+               PREFIX + 'name': 'data1', PREFIX + 'dc_name': 'dc'}
+    storage.update(kwargs)
+    return storage
+
+
+def _added(connection):
+    return [call[1] for call in connection.calls
+            if call[0] == 'add' and call[1].storage is not None]
+
+
+def test_file_domain_is_added_out_of_its_path():
+    connection = Connection()
+    storage = _storage('nfs', dr_secondary_address='10.0.0.1',
+                       dr_secondary_path='/exports/data1')
+    outcome = _add_domain(storage, PREFIX, PARAMS, HostCache())(connection)
+
+    assert outcome['host'] == 'host1'
+    assert 'login_seconds' not in outcome
+    [sd] = _added(connection)
+    assert sd.id is None
+    assert sd.name == 'data1'
+    assert sd.host.name == 'host1'
+    assert sd.storage.type == otypes.StorageType.NFS
+    assert sd.storage.address == '10.0.0.1'
+    assert sd.storage.path == '/exports/data1'
+    assert connection.attached == ['new']
+
+
+def test_iscsi_domain_is_imported_after_logins_to_all_targets():
+    connection = Connection()
+    storage = _storage('iscsi', dr_secondary_address='10.0.0.2',
+                       dr_secondary_port='3261',
+                       dr_secondary_target=['iqn.a', 'iqn.b'],
+                       dr_secondary_username='user')
+    outcome = _add_domain(storage, PREFIX, PARAMS, HostCache())(connection)
+
+    assert 'login_seconds' in outcome
+    logins = [call[1] for call in connection.calls
+              if call[0] == 'iscsi_login']
+    assert logins == ['iqn.a', 'iqn.b']
+    [sd] = _added(connection)
+    assert sd.id == 'sd1'
+    assert sd.import_
+    assert sd.storage.type == otypes.StorageType.ISCSI
+    assert sd.storage.address == '10.0.0.2'
+    [lun] = sd.storage.logical_units
+    assert (lun.address, lun.port, lun.target) == ('10.0.0.2', 3261, 'iqn.a')
+    assert (lun.username, lun.password) == ('user', None)
+    assert connection.calls.index(('iscsi_login', 'iqn.b')) < \
+        connection.calls.index(('add', sd))
+
+
+def test_fcp_domain_is_imported_without_logins():
+    connection = Connection()
+    outcome = _add_domain(_storage('fcp'), PREFIX, PARAMS,
+                          HostCache())(connection)
+
+    assert 'login_seconds' not in outcome
+    assert not [call for call in connection.calls
+                if call[0] == 'iscsi_login']
+    [sd] = _added(connection)
+    assert sd.id == 'sd1'
+    assert sd.import_
+    assert sd.storage.type == otypes.StorageType.FCP
+    assert sd.storage.logical_units is None
+
+
+def test_existing_domain_is_only_attached():
+    connection = Connection(domains=[otypes.StorageDomain(id='sd1',
+                                                          name='data1')])
+    _add_domain(_storage('fcp'), PREFIX, PARAMS, HostCache())(connection)
+
+    assert not _added(connection)
+    assert connection.attached == ['sd1']
+
+
+def test_attached_domain_is_not_attached_again():
+    connection = Connection(domains=[otypes.StorageDomain(id='sd1',
+                                                          name='data1')],
+                            attached=['sd1'])
+    _add_domain(_storage('fcp'), PREFIX, PARAMS, HostCache())(connection)
+
+    assert not [call for call in connection.calls if call[0] == 'add']
+    assert connection.attached == ['sd1']
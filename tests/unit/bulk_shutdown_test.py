@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ovirt_dr_bulk_shutdown import _wait_for_down
+
+PREFIX = 'dr_primary_'
+STORAGES = [
+    {PREFIX + 'name': 'data1', PREFIX + 'dc_name': 'dc'},
+    {PREFIX + 'name': 'data2', PREFIX + 'dc_name': 'dc'},
+]
+
+
+class Vm:
+
+    def __init__(self, vm_id, name, status):
+        self.id = vm_id
+        self.name = name
+        self.status = status
+
+
+class VmsService:
+    """
+    Stand-in for the VMs service, whose searches return the next of
+    'polls', a list of dicts of storage domain name to the VMs which are
+    not down on it.
+    """
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.searches = []
+
+    def list(self, search):
+        self.searches.append(search)
+        storage = search.split('storage.name=')[1].split(' ')[0]
+        poll = self.polls[min((len(self.searches) - 1) // len(STORAGES),
+                              len(self.polls) - 1)]
+        return poll.get(storage, [])
+
+
+def test_vms_are_down_once_they_drop_out_of_the_search():
+    vms_service = VmsService([
+        {'data1': [Vm('1', 'vm1', 'powering_down')],
+         'data2': [Vm('1', 'vm1', 'powering_down'),
+                   Vm('2', 'vm2', 'powering_down')]},
+        {'data2': [Vm('2', 'vm2', 'powering_down')]},
+        {},
+    ])
+    pending = {'1': 0, '2': 0}
+
+    down, statuses = _wait_for_down(vms_service, STORAGES, PREFIX, pending,
+                                    timeout=5, poll_interval=0)
+
+    assert sorted(down) == ['1', '2']
+    assert not pending
+    assert vms_service.searches[0] == (
+        'status != down and storage.name=data1 and datacenter=dc')
+    assert len(vms_service.searches) == 3 * len(STORAGES)
+
+
+def test_vm_still_found_by_the_search_is_not_down():
+    vms_service = VmsService([
+        {'data1': [Vm('1', 'vm1', 'powering_down')]},
+    ])
+    pending = {'1': 0}
+
+    down, statuses = _wait_for_down(vms_service, STORAGES, PREFIX, pending,
+                                    timeout=0, poll_interval=0)
+
+    assert down == {}
+    assert pending == {'1': 0}
+    assert statuses == {'1': 'powering_down'}
+
+
+def test_vm_missing_from_the_search_is_down():
+    vms_service = VmsService([{'data1': [Vm('2', 'vm2', 'up')]}])
+    pending = {'1': 0}
+
+    down, statuses = _wait_for_down(vms_service, STORAGES, PREFIX, pending,
+                                    timeout=0, poll_interval=0)
+
+    assert list(down) == ['1']
+    assert not pending
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ovirt_dr_bulk_start import percentiles, split_waves
+
+
+def _vm(vm_id, name, ha=False):
+    return {'id': vm_id, 'name': name,
+            'high_availability': {'enabled': ha}}
+
+
+VMS = [
+    _vm('1', 'db1', ha=True),
+    _vm('2', 'db2'),
+    _vm('3', 'web1'),
+    _vm('4', 'web2', ha=True),
+    _vm('5', 'batch'),
+]
+
+
+def _names(waves):
+    return [(name, [vm['name'] for vm in members]) for name, members in waves]
+
+
+def test_ha_first_then_tag_then_names_then_rest():
+    waves = [
+        {'name': 'databases', 'tag': 'dr_db'},
+        {'name': 'frontends', 'vms': ['web1', 'web2']},
+    ]
+    tagged = {'dr_db': set(['1', '2'])}
+    assert _names(split_waves(VMS, waves, tagged, True)) == [
+        ('high_availability', ['db1', 'web2']),
+        ('databases', ['db2']),
+        ('frontends', ['web1']),
+        ('rest', ['batch']),
+    ]
+
+
+def test_without_ha_first_a_vm_is_in_the_first_wave_it_belongs_to():
+    waves = [
+        {'name': 'frontends', 'vms': ['web1', 'db1']},
+        {'name': 'databases', 'tag': 'dr_db'},
+    ]
+    tagged = {'dr_db': set(['1', '2'])}
+    assert _names(split_waves(VMS, waves, tagged, False)) == [
+        ('frontends', ['db1', 'web1']),
+        ('databases', ['db2']),
+        ('rest', ['web2', 'batch']),
+    ]
+
+
+def test_empty_waves_are_dropped():
+    waves = [{'name': 'none', 'vms': ['missing']}]
+    vms = [_vm('2', 'db2')]
+    assert _names(split_waves(vms, waves, {}, True)) == [('rest', ['db2'])]
+
+
+def test_percentiles():
+    assert percentiles([]) == {}
+    assert percentiles([3.0]) == {'p50': 3.0, 'p90': 3.0, 'p99': 3.0,
+                                  'max': 3.0}
+    values = [float(i) for i in range(100, 0, -1)]
+    assert percentiles(values) == {'p50': 50.0, 'p90': 90.0, 'p99': 99.0,
+                                   'max': 100.0}
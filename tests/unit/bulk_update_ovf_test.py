@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import ovirtsdk4.types as otypes
+
+from ovirt_dr_bulk_update_ovf import _job_status, _wait_for_jobs
+
+
+class Future:
+
+    def __init__(self, value):
+        self.value = value
+
+    def wait(self):
+        return self.value
+
+
+class JobsService:
+    """
+    Stand-in for the jobs service, whose searches of a correlation ID
+    return the next of the lists of job statuses in 'polls', the last one
+    once they were all returned.
+    """
+
+    def __init__(self, polls):
+        self.polls = polls
+        self.searches = {}
+
+    def list(self, search, wait=True):
+        correlation_id = search.split('=', 1)[1]
+        index = self.searches.get(correlation_id, 0)
+        self.searches[correlation_id] = index + 1
+        polls = self.polls[correlation_id]
+        return Future([
+            otypes.Job(description='Update OVF', status=status)
+            for status in polls[min(index, len(polls) - 1)]
+        ])
+
+
+STARTED = otypes.JobStatus.STARTED
+FINISHED = otypes.JobStatus.FINISHED
+FAILED = otypes.JobStatus.FAILED
+
+
+def _jobs(*statuses):
+    return [otypes.Job(description='Update OVF', status=status)
+            for status in statuses]
+
+
+def test_job_status():
+    assert _job_status([]) == (True, None)
+    assert _job_status(_jobs(FINISHED, STARTED)) == (True, None)
+    assert _job_status(_jobs(FINISHED)) == (False, None)
+    assert _job_status(_jobs(FINISHED, FAILED)) == (
+        False, 'The job Update OVF is failed')
+
+
+def test_update_without_job_yet_is_pending():
+    jobs_service = JobsService({'a': [[], [STARTED], [FINISHED]]})
+    pending = {'a': 0}
+
+    ended = _wait_for_jobs(jobs_service, pending, 2, 5, 0)
+
+    assert ended['a'][1] is None
+    assert not pending
+    assert jobs_service.searches == {'a': 3}
+
+
+def test_update_without_job_fails_at_the_timeout():
+    jobs_service = JobsService({'a': [[]], 'b': [[STARTED]]})
+    pending = {'a': 0, 'b': 0}
+
+    ended = _wait_for_jobs(jobs_service, pending, 2, 0, 0)
+
+    assert ended['a'][1] == 'No job found for correlation id a'
+    # The update whose job is still running did not end.
+    assert pending == {'b': 0}
+
+
+def test_failed_job_fails_the_update():
+    jobs_service = JobsService({'a': [[STARTED], [FAILED]],
+                                'b': [[FINISHED]]})
+    pending = {'a': 0, 'b': 0}
+
+    ended = _wait_for_jobs(jobs_service, pending, 1, 5, 0)
+
+    assert ended['a'][1] == 'The job Update OVF is failed'
+    assert ended['b'][1] is None
+    assert not pending
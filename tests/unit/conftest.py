@@ -0,0 +1,16 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import sys
+
+import ansible.module_utils
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+# Import the modules of the role the way ansible runs them, with the
+# module_utils of the role available as ansible.module_utils.
+sys.path.insert(0, os.path.join(ROOT, 'library'))
+ansible.module_utils.__path__.append(os.path.join(ROOT, 'module_utils'))
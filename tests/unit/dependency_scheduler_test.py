@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+
+import pytest
+
+from ansible.module_utils import ovirt_dr
+from ansible.module_utils.ovirt_dr import DependencyScheduler
+
+
+class Connection:
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self, logout=True):
+        self.closed = True
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    created = []
+
+    def _create_connection(auth, connections=1):
+        created.append(Connection())
+        return created[-1]
+
+    monkeypatch.setattr(ovirt_dr, 'create_connection', _create_connection)
+    return created
+
+
+def _task(order, key, seconds=0, error=None):
+    def run(connection):
+        time.sleep(seconds)
+        order.append(key)
+        if error is not None:
+            raise error
+        return key
+    return run
+
+
+def test_task_runs_after_its_dependencies(connections):
+    order = []
+    scheduler = DependencyScheduler({'token': 'token'}, 4)
+    scheduler.add('vm', _task(order, 'vm'), depends_on=['sub_template'])
+    scheduler.add('sub_template', _task(order, 'sub_template'),
+                  depends_on=['template'])
+    scheduler.add('template', _task(order, 'template', seconds=0.05))
+    scheduler.add('other', _task(order, 'other'), depends_on=['missing'])
+    outcomes = scheduler.run()
+
+    assert order.index('template') < order.index('sub_template') < \
+        order.index('vm')
+    # A dependency which is not a task of the scheduler is ignored.
+    assert order[0] == 'other'
+    assert dict((key, outcome[0]) for key, outcome in outcomes.items()) == {
+        'vm': 'vm', 'sub_template': 'sub_template', 'template': 'template',
+        'other': 'other'}
+    assert connections and all(c.closed for c in connections)
+
+
+def test_failed_dependency_does_not_block_its_dependents(connections):
+    order = []
+    scheduler = DependencyScheduler({'token': 'token'}, 2)
+    scheduler.add('template', _task(order, 'template',
+                                    error=ValueError("locked")))
+    scheduler.add('vm', _task(order, 'vm'), depends_on=['template'])
+    outcomes = scheduler.run()
+
+    assert order == ['template', 'vm']
+    assert str(outcomes['template'][1]) == "locked"
+    assert outcomes['vm'][:2] == ('vm', None)
+
+
+def test_dependency_cycle_fails(connections):
+    scheduler = DependencyScheduler({'token': 'token'}, 2)
+    scheduler.add('a', _task([], 'a'), depends_on=['b'])
+    scheduler.add('b', _task([], 'b'), depends_on=['a'])
+    scheduler.add('c', _task([], 'c'))
+    with pytest.raises(Exception, match="Dependency cycle between: a, b"):
+        scheduler.run()
+    assert all(c.closed for c in connections)
+
+
+def test_critical_path_is_the_chain_which_ended_last(connections):
+    scheduler = DependencyScheduler({'token': 'token'}, 1)
+    scheduler.add('template', _task([], 'template', seconds=0.05))
+    scheduler.add('short', _task([], 'short'))
+    scheduler.add('vm', _task([], 'vm', seconds=0.05),
+                  depends_on=['template'])
+    outcomes = scheduler.run()
+
+    path = scheduler.critical_path(outcomes)
+    assert [key for key, seconds, waited in path] == ['template', 'vm']
+    assert all(seconds >= 0.05 for key, seconds, waited in path)
+    assert all(waited >= 0 for key, seconds, waited in path)
+    assert scheduler.critical_path({}) == []
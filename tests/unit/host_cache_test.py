@@ -0,0 +1,91 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from ansible.module_utils.ovirt_dr import HostCache
+
+
+class Host:
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Connection:
+    """
+    Stand-in for an SDK connection whose hosts service lists the hosts of
+    'hosts', a dict of data center name to host names, calling 'listing'
+    with the data center name first.
+    """
+
+    def __init__(self, hosts, listing=None):
+        self.hosts = hosts
+        self.listing = listing
+        self.searches = []
+
+    def system_service(self):
+        return self
+
+    def hosts_service(self):
+        return self
+
+    def list(self, search):
+        self.searches.append(search)
+        dc_name = search.rsplit('=', 1)[1]
+        if self.listing is not None:
+            self.listing(dc_name)
+        return [Host(name) for name in self.hosts.get(dc_name, [])]
+
+
+def test_hosts_are_picked_round_robin_and_listed_once():
+    connection = Connection({'dc': ['host1', 'host2']})
+    cache = HostCache()
+
+    picked = [cache.pick(connection, 'dc').name for i in range(5)]
+
+    assert picked == ['host1', 'host2', 'host1', 'host2', 'host1']
+    assert connection.searches == ['status=up and datacenter=dc']
+
+
+def test_data_centers_are_listed_in_parallel():
+    # Every listing only returns once the other data center is listed too,
+    # which would never happen if a listing held the lock of the cache.
+    both_listed = threading.Barrier(2, timeout=5)
+    connection = Connection({'dc1': ['host1'], 'dc2': ['host2']},
+                            lambda dc_name: both_listed.wait())
+    cache = HostCache()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        picked = list(pool.map(lambda dc: cache.pick(connection, dc).name,
+                               ['dc1', 'dc2']))
+
+    assert picked == ['host1', 'host2']
+
+
+def test_data_center_is_listed_once_by_concurrent_threads():
+    connection = Connection({'dc': ['host1']})
+    cache = HostCache()
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda i: cache.pick(connection, 'dc'), range(32)))
+
+    assert len(connection.searches) == 1
+
+
+def test_data_center_without_up_hosts_is_listed_again():
+    connection = Connection({})
+    cache = HostCache()
+
+    with pytest.raises(Exception, match='No hosts available'):
+        cache.pick(connection, 'dc')
+    connection.hosts['dc'] = ['host1']
+
+    assert cache.pick(connection, 'dc').name == 'host1'
+    assert len(connection.searches) == 2
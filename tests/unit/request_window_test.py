@@ -0,0 +1,54 @@
+#!/usr/bin/python3
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.ovirt_dr import RequestWindow
+
+
+class Future:
+
+    def __init__(self, value=None, error=None):
+        self._value = value
+        self._error = error
+
+    def wait(self):
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+def _fail_to_send():
+    raise ValueError("connection refused")
+
+
+def test_outcomes_are_returned_in_submit_order():
+    window = RequestWindow(2)
+    window.submit('a', lambda: Future('A'))
+    assert not window.full()
+    window.submit('b', lambda: Future('B'))
+    assert window.full()
+    assert window.wait_next()[:3] == ('a', 'A', None)
+    assert window.wait_next()[:3] == ('b', 'B', None)
+    assert len(window) == 0
+
+
+def test_errors_are_returned_instead_of_raised():
+    window = RequestWindow(3)
+    window.submit('send', _fail_to_send)
+    window.submit('wait', lambda: Future(error=ValueError("VM is locked")))
+    window.submit('ok', lambda: Future('done'))
+
+    key, value, error, seconds = window.wait_next()
+    assert (key, value, str(error)) == ('send', None, "connection refused")
+    key, value, error, seconds = window.wait_next()
+    assert (key, value, str(error)) == ('wait', None, "VM is locked")
+    assert seconds >= 0
+    assert window.wait_next()[:3] == ('ok', 'done', None)
+
+
+def test_limit_is_at_least_one():
+    window = RequestWindow(0)
+    assert not window.full()
+    window.submit('a', lambda: Future())
+    assert window.full()